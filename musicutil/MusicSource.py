@@ -1,19 +1,27 @@
 #Imports
 import os, sys
+import codecs
 import importlib
 import inspect
+import threading
 import warnings
 from enum import Enum
 from itertools import chain
 
-import requests
-from bs4 import BeautifulSoup as bs, element, NavigableString
 import json
 
 try:
-    from .util import get_inner_texts, convert_size, Cache
+    from .util import convert_size, Cache
+    from .transport import BaseTransport, RequestsTransport, get_transport
+    from .extract import Extractor, Field, Group
+    from .singleflight import SingleFlight, coalesced
+    from .bandwidth import get_manager, INTERACTIVE
 except (ModuleNotFoundError, ImportError):
-    from util import get_inner_texts, convert_size, Cache
+    from util import convert_size, Cache
+    from transport import BaseTransport, RequestsTransport, get_transport
+    from extract import Extractor, Field, Group
+    from singleflight import SingleFlight, coalesced
+    from bandwidth import get_manager, INTERACTIVE
 
 SOURCES = {}
 SRC_DEFAULT = 'chiasenhac_vn'
@@ -41,6 +49,50 @@ class SourceException(Exception):
 
 
 class BaseSource(object):
+    """Common state shared by every music source.
+
+       Thread-safe mode:-
+            When 'thread_safe' is True one source instance can be
+            shared by many threads. Request headers are built per
+            request from a private copy of 'header', state updated
+            by the source (like search url) is guarded by a lock and
+            the pooled connections of 'requests_session' are kept
+            open between requests instead of being closed after
+            every call. Pass 'requests_session' (True or a session)
+            to actually pool connections across threads.
+
+       Transports:-
+            All http traffic goes through 'transport', which can be
+            a transport instance or the name of one registered in
+            'transport.TRANSPORTS' ('requests' [Default], 'urllib3',
+            'http2'). 'requests_session' is only used by the
+            requests transport.
+
+       Parsing:-
+            If 'parse_pool' (a parsing.ParsePool) is given, pages
+            are parsed in its worker processes instead of the
+            calling thread.
+
+       Warm up:-
+            If 'warmer' (a warmup.Warmer) is given, the source host
+            is resolved and connected to in background when the
+            source is created, and so are new data hosts returned
+            by download_details.
+
+       Coalescing:-
+            'coalesce' merges identical concurrent calls, duplicate
+            callers wait for the call in flight and share its
+            result or exception.
+            False  => No coalescing [Default]
+            'request' => Identical GET/HEAD requests (same method,
+                         url and params)
+            'call' => Identical search/song_info/download_details
+                      calls (fetch and parsing are both shared)
+    """
+
+    #Connections kept per host by sessions built in thread-safe mode.
+    _POOL_MAXSIZE = 32
+
     def __init__(self,
                  prefix,
                  header,
@@ -49,28 +101,51 @@ class BaseSource(object):
                  trace_out=False,
                  requests_session=None,
                  proxies=None,
-                 requests_timeout=None):
+                 requests_timeout=None,
+                 thread_safe=False,
+                 transport=None,
+                 parse_pool=None,
+                 warmer=None,
+                 coalesce=False):
         self.name = name
         self.basename = name
         self.trace = trace
         self.trace_out = trace_out
         self.proxies = proxies
         self.requests_timeout = requests_timeout
+        self.thread_safe = thread_safe
+        self.parse_pool = parse_pool
+        self.warmer = warmer
+        self.coalesce = coalesce
+        self._flight = SingleFlight()
+        self._lock = threading.RLock()
 
         assert prefix
         self.prefix = prefix
 
         assert isinstance(header, dict)
-        self.header = header
+        #Private copy, so instances never share (and mutate)
+        #the class level headers.
+        self.header = dict(header)
 
-        if isinstance(requests_session, requests.Session):
-            self._session = requests_session
+        pool_maxsize = self._POOL_MAXSIZE if thread_safe else 10
+        if isinstance(transport, BaseTransport):
+            self._transport = transport
         else:
-            if requests_session:  # Build a new session.
-                self._session = requests.Session()
-            else:  # Use the Requests API module as a "session".
-                from requests import api
-                self._session = api
+            transport_class = get_transport(transport)
+            if issubclass(transport_class, RequestsTransport):
+                #Closing the adapter drops every pooled connection of
+                #the session, which other threads may be using.
+                self._transport = transport_class(
+                    requests_session,
+                    proxies,
+                    pool_maxsize,
+                    close_connections=not thread_safe)
+            else:
+                self._transport = transport_class(proxies, pool_maxsize)
+
+        if warmer:
+            warmer.warm([prefix], self._transport)
 
 
 class BaseSourceScrapper(BaseSource):
@@ -84,28 +159,57 @@ class BaseSourceScrapper(BaseSource):
                  trace_out=False,
                  requests_session=None,
                  proxies=None,
-                 requests_timeout=None):
+                 requests_timeout=None,
+                 thread_safe=False,
+                 transport=None,
+                 parse_pool=None,
+                 warmer=None,
+                 coalesce=False):
         super().__init__(self._PREFIX, self._HEADERS, self._NAME, trace,
                          trace_out, requests_session, proxies,
-                         requests_timeout)
+                         requests_timeout, thread_safe, transport,
+                         parse_pool, warmer, coalesce)
 
     def _internal_call(self, method, url, return_json, payload, params):
-        args = dict(params=params)
-        args["timeout"] = self.requests_timeout
+        if not url.startswith('http'):
+            url = self.prefix + url
 
-        headers = self.header
-        headers['Host'] = url.split('/')[2]
-        if return_json:
-            headers['Content-Type'] = 'application/json'
+        if (self.coalesce == 'request' and method in ('GET', 'HEAD')
+                and not payload):
+            key = (method, url, return_json,
+                   tuple(sorted((params or {}).items())))
+            try:
+                hash(key)
+            except TypeError:
+                #Like list params, not coalesced.
+                key = None
+            if key is not None:
+                return self._flight.do(key, self._request, method, url,
+                                       return_json, payload, params)
+        return self._request(method, url, return_json, payload, params)
+
+    def _request(self, method, url, return_json, payload, params):
+        data = None
 
         if not url.startswith('http'):
             url = self.prefix + url
 
+        #Build headers per request, never touch the shared ones.
+        headers = dict(self.header)
+        headers['Host'] = url.split('/')[2]
+        if return_json:
+            headers['Content-Type'] = 'application/json'
+
         if payload:
-            args["data"] = json.dumps(payload)
+            data = json.dumps(payload)
 
-        r = self._session.request(
-            method, url, headers=headers, proxies=self.proxies, **args)
+        r = self._transport.request(
+            method,
+            url,
+            headers=headers,
+            params=params,
+            data=data,
+            timeout=self.requests_timeout)
 
         if self.trace_out:
             print("Base url :", url)
@@ -118,20 +222,17 @@ class BaseSourceScrapper(BaseSource):
             if payload:
                 print("DATA", json.dumps(payload))
 
-        try:
-            r.raise_for_status()
-        except:
+        if not r.ok:
             raise SourceException(
                 r.status_code,
                 -1,
                 '%s:\n %s' % (r.url, 'Error Occured'),
                 headers=r.headers)
-        finally:
-            r.connection.close()
 
-        if r.text and len(r.text) > 0 and r.text != 'null':
+        text = r.text
+        if text and len(text) > 0 and text != 'null':
 
-            results = r.json() if return_json else r.text.strip()
+            results = r.json() if return_json else text.strip()
             if self.trace:  # pragma: no cover
                 if return_json:
                     print('RESP', results)
@@ -140,6 +241,52 @@ class BaseSourceScrapper(BaseSource):
         else:
             return None
 
+    def _stream(self, url, chunk_size=16 * 1024, **params):
+        """GET url and yield the decoded page in chunks as they
+           arrive, without keeping the whole page in memory."""
+        if not url.startswith('http'):
+            url = self.prefix + url
+
+        headers = dict(self.header)
+        headers['Host'] = url.split('/')[2]
+
+        with self._transport.stream(
+                'GET',
+                url,
+                headers=headers,
+                params=params,
+                timeout=self.requests_timeout,
+                chunk_size=chunk_size) as r:
+
+            if self.trace_out:
+                print("Base url :", url)
+
+            if not r.ok:
+                raise SourceException(
+                    r.status_code,
+                    -1,
+                    '%s:\n %s' % (r.url, 'Error Occured'),
+                    headers=r.headers)
+
+            decoder = codecs.getincrementaldecoder(r.encoding)(
+                errors='replace')
+            chunks = get_manager().stream(r.iter_bytes(), headers['Host'],
+                                          priority=INTERACTIVE)
+            for chunk in chunks:
+                text = decoder.decode(chunk)
+                if text:
+                    yield text
+            text = decoder.decode(b'', final=True)
+            if text:
+                yield text
+
+    def _parse(self, scraper, html, *args):
+        """Run scraper(html, *args) in the parse pool if there
+           is one, otherwise in the calling thread."""
+        if self.parse_pool:
+            return self.parse_pool.parse(scraper, html, *args)
+        return scraper(html, *args)
+
     def _get(self, url, args=None, payload=None, is_json=False, **kwargs):
         if args:
             kwargs.update(args)
@@ -196,15 +343,49 @@ class chiasenhac_vn(BaseSourceScrapper):
         mp3_128kbps = '128kbps'
         m4a_32kbps = '32kbps'
 
+    #Scraping rules, each page is extracted in a single pass.
+    _SEARCH_RULES = Extractor(
+        Field(None, 'div', {'id': 'nav-music'}, get=None, fields=[
+            Group('songs', 'li', fields=[
+                Field('name', 'h5', fields=[Field('url', 'a', get='@href')]),
+                Field('artist', 'div', {'class': 'author'}),
+            ]),
+        ]))
+
+    _DOWNLOAD_RULES = Extractor(
+        Group('downloads', 'a', {'class': 'download_item'}, fields=[
+            Field('url', 'a', get='@href'),
+            Field('texts', 'a', get='texts'),
+        ]))
+
+    _SONG_INFO_RULES = Extractor(
+        Field('lyrics', 'div', {'id': 'fulllyric'}, get='texts'),
+        Field(None, 'div', {'id': 'pills-plus'}, get=None, fields=[
+            Field(None, 'h4', get=None, fields=[Field('name', 'span')]),
+            Group('rows', 'li', fields=[
+                Field('text', 'li'),
+                Field('link', 'a'),
+            ]),
+        ]))
+
+    _SEARCH_URL_RULES = Extractor(
+        Field('url', 'form', {'name': 'song_list'}, get='@action'))
+
     def __init__(self,
                  requests_session=None,
                  trace=False,
                  trace_out=False,
                  proxies=None,
-                 requests_timeout=None):
+                 requests_timeout=None,
+                 thread_safe=False,
+                 transport=None,
+                 parse_pool=None,
+                 warmer=None,
+                 coalesce=False):
         super().__init__(self._PREFIX, self._HEADERS, self._NAME, trace,
                          trace_out, requests_session, proxies,
-                         requests_timeout)
+                         requests_timeout, thread_safe, transport,
+                         parse_pool, warmer, coalesce)
 
     @staticmethod
     def _is_download_a(tag):
@@ -218,64 +399,39 @@ class chiasenhac_vn(BaseSourceScrapper):
         if not max:
             max = chiasenhac_vn._MAX_SEARCH_PAGE_RESULT
 
-        soup = bs(html, 'html5lib')
-
-        songs_div = soup.find('div',attrs={'id':'nav-music'})
+        data = chiasenhac_vn._SEARCH_RULES.extract(html)
 
-        if songs_div:
-            for i, song_li in enumerate(songs_div.find_all('li')):
-                if i <= max:
-                    song_name = None
-                    song_artist = None
-                    song_url = None
+        found = 0
+        for song in data.get('songs', ()):
+            if found >= max:
+                break
+            #No song name heading, not a song item.
+            if 'name' not in song:
+                continue
 
-                    song_name_h5 = song_li.find('h5')
-                    if song_name_h5:
-                        song_name = song_name_h5.string
-
-                        song_a = song_name_h5.find('a')
-                        if song_a:
-                            song_url = song_a['href']
-                    else:
-                        max = max + 1
-                        continue
-                    
-                    song_artist_div = song_li.find('div', attrs={'class':'author'})
-                    if song_artist_div:
-                        song_artist = song_artist_div.string
-
-                    
-                    yield (song_name, song_artist, song_url)
+            found += 1
+            yield (song['name'], song.get('artist'), song.get('url'))
 
     @staticmethod
     def _scrap_download_details(html):
-        soup = bs(html, 'html5lib')
         download_data = []
 
-        #Download links anchor tag
-        # a_downloads = soup.find_all(chiasenhac_vn._is_download_a)
-        a_downloads = soup.find_all('a', class_="download_item")
+        data = chiasenhac_vn._DOWNLOAD_RULES.extract(html)
 
-        for a_download in a_downloads:
+        for a_download in data.get('downloads', ()):
             size = None
             quality = None
-            if 'href' in a_download.attrs.keys():
-                d_url = a_download['href']
-            else:
-                d_url = None
-
-            data = [line for line in get_inner_texts(a_download)]
+            d_url = a_download.get('url')
+            texts = a_download.get('texts', [])
 
-            if len(data) == 2 and chiasenhac_vn._M4A_32_STR in data[1]:
-                size = data[1].split(chiasenhac_vn._M4A_32_STR)[1].strip()
+            if len(texts) == 2 and chiasenhac_vn._M4A_32_STR in texts[1]:
+                size = texts[1].split(chiasenhac_vn._M4A_32_STR)[1].strip()
                 quality = chiasenhac_vn.Quality.m4a_32kbps
 
-            elif len(data) == 4:
-                size = data[3].strip()
-                # quality = QUALITY_DICT[data[1].strip()]
-                # quality = tuple(q for q in Quality if q.value == data[1].strip)[0]
+            elif len(texts) == 4:
+                size = texts[3].strip()
                 for q in chiasenhac_vn.Quality:
-                    if q.value in data[2].strip():
+                    if q.value in texts[2].strip():
                         quality = q
 
             file_data = (quality, d_url, size)
@@ -291,36 +447,24 @@ class chiasenhac_vn(BaseSourceScrapper):
         year = None
         lyrics = []
 
-        soup = bs(html, 'html5lib')
-
-        div_lyric = soup.find('div', attrs={"id": "fulllyric"})
-        div_songinfo = soup.find('div', attrs={"id": "pills-plus"})
+        data = chiasenhac_vn._SONG_INFO_RULES.extract(html)
 
         #For Song Name
-        div_h4 = div_songinfo.find('h4')
-        if div_h4:
-            span_songname = div_h4.find('span')
-            if span_songname:
-                song_name = span_songname.string.strip()
-
-        for i, tag in enumerate(div_songinfo.find_all('li')):
-            if i == 0:
-                try:
-                    artist = tag.find(a).string
-                except:
-                    pass
-            elif i == 1:
-                try:
-                    album = tag.find(a).string
-                except:
-                    pass
-            elif i == 2:
-                year = tag.string
-
+        if data.get('name'):
+            song_name = data['name'].strip()
+
+        #Artist, album and year are first three rows of song info.
+        rows = data.get('rows', [])
+        if len(rows) > 0:
+            artist = rows[0].get('link')
+        if len(rows) > 1:
+            album = rows[1].get('link')
+        if len(rows) > 2:
+            year = rows[2].get('text')
 
         #For Lyrics
-        if div_lyric:
-            lyrics = tuple(line.strip() for line in get_inner_texts(div_lyric))
+        if 'lyrics' in data:
+            lyrics = tuple(line.strip() for line in data['lyrics'])
 
         return (song_name, artist, album, year, lyrics)
 
@@ -353,10 +497,9 @@ class chiasenhac_vn(BaseSourceScrapper):
            requests for search queries."""
 
         if not html:
-            html = self._get(self._PREFIX)
-        soup = bs(html, 'html5lib')
+            html = self._get(self.prefix)
 
-        url = soup.find('form', attrs={'name': 'song_list'})['action']
+        url = self._SEARCH_URL_RULES.extract(html)['url']
 
         if url.endswith('?s='):
             url = url[:-3]
@@ -367,13 +510,43 @@ class chiasenhac_vn(BaseSourceScrapper):
         return url
 
     def _update_search_url(self, html=None):
-        """Tries to update search url."""
+        """Tries to update search url and returns the url to use."""
+        #Fetched outside the lock, so searches are not serialized
+        #behind the homepage request.
         try:
-            self._S_URL = self.get_search_url(html)
+            url = self.get_search_url(html)
         except:
-            pass
-
-    def search(self, query, max=_MAX_SEARCH, json_serializable=False):
+            url = None
+        with self._lock:
+            if url:
+                self._S_URL = url
+            return self._S_URL
+
+    def _search_stream(self, s_url, query, max):
+        """Yield search results while the pages are downloaded."""
+        found = 0
+        page = 1
+        while found < max:
+            page_found = 0
+            html = self._stream(s_url, q=query, page_music=page)
+            for name, song in self._SEARCH_RULES.stream(html):
+                #No song name heading, not a song item.
+                if 'name' not in song:
+                    continue
+                yield (song['name'], song.get('artist'), song.get('url'))
+                found += 1
+                page_found += 1
+                if found >= max:
+                    #Rest of the page is never downloaded.
+                    html.close()
+                    return
+            if not page_found:
+                return
+            page += 1
+
+    @coalesced
+    def search(self, query, max=_MAX_SEARCH, json_serializable=False,
+               stream=False):
         """Search the query from music source.
            
            Search the given query from http://chiasenhac.vm
@@ -385,6 +558,10 @@ class chiasenhac_vn(BaseSourceScrapper):
                      to retrive. It can take value upto 25 
                      [Default: 5]
                 json_serializable: True or False
+                stream: if True, result pages are parsed while they
+                        are downloaded and results are yielded as
+                        soon as they arrive, keeping only the
+                        current result in memory.
                     
            Returns:
                 IF json_serializable=False [DEFAULT] :-
@@ -405,9 +582,13 @@ class chiasenhac_vn(BaseSourceScrapper):
                 then it will return the status_code of response
                 object.
         """
-        self._update_search_url()
+        #Keep a local copy so that all pages of this search use
+        #the same url even if other threads update it meanwhile.
+        s_url = self._update_search_url()
 
-        if not json_serializable:
+        if stream and not json_serializable:
+            return self._search_stream(s_url, query, max)
+        elif not json_serializable:
             odd_num = max % self._MAX_SEARCH_PAGE_RESULT
             pages = max // self._MAX_SEARCH_PAGE_RESULT
 
@@ -428,20 +609,23 @@ class chiasenhac_vn(BaseSourceScrapper):
             #     return result
             result = []
             for page_num in range(0, pages):
-                html = self._get(self._S_URL, q=query, page_music=page_num + 1)
-                result = chain(result, self._scrap_search(html))
+                html = self._get(s_url, q=query, page_music=page_num + 1)
+                result = chain(result, self._parse(self._scrap_search, html))
             if odd_num:
-                html = self._get(self._S_URL, q=query, page_music=pages + 1)
-                return chain(result, self._scrap_search(html, max=odd_num))
+                html = self._get(s_url, q=query, page_music=pages + 1)
+                return chain(result,
+                             self._parse(self._scrap_search, html, odd_num))
 
             return result
         else:
-            return [{
+            result = ({
                 'song': data[0],
                 'artist': data[1],
                 'url': data[2]
-            } for data in self.search(query, max)]
+            } for data in self.search(query, max, stream=stream))
+            return result if stream else list(result)
 
+    @coalesced
     def download_details(self, url, json_serializable=False):
         """Scrap the download url and other details.
 
@@ -470,7 +654,10 @@ class chiasenhac_vn(BaseSourceScrapper):
 
         # html = self._get(url[:-5] + '_download.html')
         html = self._get(url)
-        datas = self._scrap_download_details(html)
+        datas = self._parse(self._scrap_download_details, html)
+
+        if self.warmer:
+            self.warmer.warm((data[1] for data in datas), self._transport)
 
         if json_serializable:
             return [{
@@ -481,6 +668,7 @@ class chiasenhac_vn(BaseSourceScrapper):
         else:
             return datas
 
+    @coalesced
     def song_info(self, url, json_serializable=False):
         """Scrap the song details from given url.
 
@@ -508,7 +696,7 @@ class chiasenhac_vn(BaseSourceScrapper):
 
         if not json_serializable:
             html = self._get(url)
-            return self._scrap_song_info(html)
+            return self._parse(self._scrap_song_info, html)
         else:
             data = self.song_info(url)
             return {
@@ -0,0 +1,220 @@
+#Imports
+import time
+import threading
+from collections import deque, Counter
+from itertools import count
+
+#Priority classes, lower value is served first.
+INTERACTIVE = 0
+BULK = 1
+
+#Marker for "leave this limit unchanged".
+_KEEP = object()
+
+_MANAGER = None
+_MANAGER_LOCK = threading.Lock()
+
+
+class TokenBucket:
+    """Token bucket of 'rate' bytes/sec holding at most 'burst'
+       bytes [Default: one second worth]. rate None means
+       unlimited. Not thread safe, used under manager lock."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+
+    def set_rate(self, rate, burst=None):
+        #Tokens earned so far are kept (up to the new capacity), so
+        #changing the limit does not allow an extra burst.
+        self._refill(time.monotonic())
+        self.rate = rate
+        self.capacity = burst or rate
+        if rate:
+            self.tokens = min(self.tokens or 0, self.capacity)
+        else:
+            self.tokens = None
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, nbytes, now):
+        """Seconds to wait before 'nbytes' can be taken."""
+        if not self.rate:
+            return 0
+        self._refill(now)
+        need = min(nbytes, self.capacity)
+        if self.tokens >= need:
+            return 0
+        return (need - self.tokens) / self.rate
+
+    def take(self, nbytes):
+        #Requests bigger than capacity leave the bucket in debt,
+        #so the average rate still holds.
+        if self.rate:
+            self.tokens -= nbytes
+
+
+class BandwidthManager:
+    """Shape bandwidth of concurrent transfers.
+
+       Transfers take tokens for every chunk they receive from
+       per host, per job and total token buckets. Per host and
+       per job buckets are taken in any order, the total bucket
+       is handed out first to higher priority classes and then in
+       arrival order, so with small chunks active transfers share
+       it fairly and interactive ones preempt bulk ones.
+
+       Limits can be changed any time with 'set_limits',
+       'set_host_limit' and 'set_job_limit'.
+
+       Args:
+            total: Total bytes/sec of all transfers (None: no limit)
+            per_host: Default bytes/sec limit of each host.
+            per_job: Default bytes/sec limit of each job.
+            chunk_size: Largest piece of data taken at once.
+    """
+
+    def __init__(self, total=None, per_host=None, per_job=None,
+                 chunk_size=16 * 1024):
+        self.chunk_size = chunk_size
+        self.per_host = per_host
+        self.per_job = per_job
+        self._total = TokenBucket(total)
+        self._hosts = {}
+        self._jobs = {}
+        self._host_limits = {}
+        self._job_limits = {}
+        self._users = Counter()
+        self._waiting = {INTERACTIVE: deque(), BULK: deque()}
+        self._tickets = count()
+        self._cond = threading.Condition()
+
+    def set_limits(self, total=_KEEP, per_host=_KEEP, per_job=_KEEP):
+        """Change limits at runtime, None removes a limit."""
+        with self._cond:
+            if total is not _KEEP:
+                self._total.set_rate(total)
+            if per_host is not _KEEP:
+                self.per_host = per_host
+                for host, bucket in self._hosts.items():
+                    if host not in self._host_limits:
+                        bucket.set_rate(per_host)
+            if per_job is not _KEEP:
+                self.per_job = per_job
+                for job, bucket in self._jobs.items():
+                    if job not in self._job_limits:
+                        bucket.set_rate(per_job)
+            self._cond.notify_all()
+
+    def set_host_limit(self, host, rate):
+        """Limit a single host, overriding 'per_host'."""
+        with self._cond:
+            self._host_limits[host] = rate
+            if host in self._hosts:
+                self._hosts[host].set_rate(rate)
+            self._cond.notify_all()
+
+    def set_job_limit(self, job, rate):
+        """Limit a single job, overriding 'per_job'."""
+        with self._cond:
+            self._job_limits[job] = rate
+            if job in self._jobs:
+                self._jobs[job].set_rate(rate)
+            self._cond.notify_all()
+
+    def _bucket(self, buckets, limits, default, key):
+        if key is None:
+            return None
+        if key not in buckets:
+            rate = limits.get(key, default)
+            if rate is None:
+                return None
+            buckets[key] = TokenBucket(rate)
+        return buckets[key]
+
+    def _first_waiting(self):
+        for priority in sorted(self._waiting):
+            if self._waiting[priority]:
+                return priority, self._waiting[priority][0]
+        return None
+
+    def acquire(self, nbytes, host=None, job=None, priority=BULK):
+        """Block until 'nbytes' may be transferred."""
+        with self._cond:
+            #Per host and per job buckets, no ordering between waiters.
+            while True:
+                buckets = [b for b in (
+                    self._bucket(self._hosts, self._host_limits,
+                                 self.per_host, host),
+                    self._bucket(self._jobs, self._job_limits,
+                                 self.per_job, job)) if b]
+                now = time.monotonic()
+                wait = max([b.delay(nbytes, now) for b in buckets] + [0])
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+            for bucket in buckets:
+                bucket.take(nbytes)
+
+            #Total bucket, by priority and then arrival order.
+            ticket = next(self._tickets)
+            self._waiting[priority].append(ticket)
+            try:
+                while True:
+                    if self._first_waiting() == (priority, ticket):
+                        wait = self._total.delay(nbytes, time.monotonic())
+                        if wait <= 0:
+                            self._total.take(nbytes)
+                            return
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._waiting[priority].remove(ticket)
+                self._cond.notify_all()
+
+    def _enter(self, host, job):
+        with self._cond:
+            self._users[('host', host)] += 1
+            self._users[('job', job)] += 1
+
+    def _exit(self, host, job):
+        #Drop buckets nobody uses, limits set with set_host_limit
+        #and set_job_limit are kept.
+        with self._cond:
+            for kind, key, buckets in (('host', host, self._hosts),
+                                       ('job', job, self._jobs)):
+                self._users[(kind, key)] -= 1
+                if self._users[(kind, key)] <= 0:
+                    del self._users[(kind, key)]
+                    buckets.pop(key, None)
+
+    def stream(self, chunks, host=None, job=None, priority=BULK):
+        """Yield the chunks of an iterable (like
+           response.iter_content) at the allowed rate."""
+        size = self.chunk_size
+        self._enter(host, job)
+        try:
+            for chunk in chunks:
+                for i in range(0, len(chunk), size):
+                    piece = chunk[i:i + size]
+                    self.acquire(len(piece), host, job, priority)
+                    yield piece
+        finally:
+            self._exit(host, job)
+
+
+def get_manager():
+    """Returns the process wide BandwidthManager (no limits
+       until set with set_limits)."""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = BandwidthManager()
+        return _MANAGER
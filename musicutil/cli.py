@@ -0,0 +1,246 @@
+#Imports
+import os, sys
+import argparse
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .MusicSource import get_source, SRC_DEFAULT
+    from .parsing import ParsePool
+    from .transport import TRANSPORTS
+except (ModuleNotFoundError, ImportError):
+    from MusicSource import get_source, SRC_DEFAULT
+    from parsing import ParsePool
+    from transport import TRANSPORTS
+
+
+def read_inputs(path=None):
+    """Read queries or song urls, one per line.
+
+       Args:
+            path: File to read. If None or '-' then stdin is used.
+
+       Returns:
+            A generator object of non empty stripped lines.
+    """
+    if not path or path == '-':
+        fr = sys.stdin
+    else:
+        fr = open(path, 'r', encoding='utf-8')
+    try:
+        for line in fr:
+            line = line.strip()
+            if line:
+                yield line
+    finally:
+        if fr is not sys.stdin:
+            fr.close()
+
+
+def read_done(path):
+    """Returns the set of inputs already written to a NDJSON
+       output file, so that a job can be resumed.
+
+       Inputs which failed are not counted as done. A partially
+       written last line (from an interrupted run) is truncated
+       from the file and its input is processed again.
+    """
+    done = set()
+    if not path or path == '-' or not os.path.exists(path):
+        return done
+
+    good_end = 0
+    with open(path, 'rb') as fr:
+        for line in fr:
+            if not line.endswith(b'\n'):
+                break
+            good_end += len(line)
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                continue
+            if (isinstance(record, dict) and 'input' in record
+                    and 'error' not in record):
+                done.add(record['input'])
+
+    if os.path.getsize(path) != good_end:
+        with open(path, 'r+b') as fw:
+            fw.truncate(good_end)
+    return done
+
+
+def _is_url(line):
+    return line.startswith('http://') or line.startswith('https://')
+
+
+def resolve(source, line, max=1, info=False):
+    """Resolve a single input line.
+
+       If 'line' is a song url then its download details (and
+       song info if 'info' is True) are fetched. Otherwise it is
+       searched first and the first 'max' hits are resolved.
+
+       Returns:
+            A list of dict, one per resolved song.
+    """
+    if _is_url(line):
+        hits = [{'song': None, 'artist': None, 'url': line}]
+    else:
+        hits = source.search(line, max, json_serializable=True)[:max]
+
+    songs = []
+    for hit in hits:
+        song = dict(hit)
+        if hit['url']:
+            song['downloads'] = source.download_details(
+                hit['url'], json_serializable=True)
+            if info:
+                song['info'] = source.song_info(
+                    hit['url'], json_serializable=True)
+        songs.append(song)
+    return songs
+
+
+class Stats:
+    """Thread safe counters for the final summary."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def add(self, latency, error=False):
+        with self._lock:
+            self.latencies.append(latency)
+            if error:
+                self.errors += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        lat = sorted(self.latencies)
+        total = len(lat)
+
+        def pct(p):
+            if not lat:
+                return 0.0
+            return lat[min(total - 1, int(round(p * (total - 1))))]
+
+        return ('processed: {0}, errors: {1}, elapsed: {2:.2f}s, '
+                'throughput: {3:.2f}/s\n'
+                'latency (s) mean: {4:.3f}, p50: {5:.3f}, p95: {6:.3f}, '
+                'max: {7:.3f}').format(
+                    total, self.errors, elapsed,
+                    total / elapsed if elapsed else 0.0,
+                    sum(lat) / total if total else 0.0,
+                    pct(0.50), pct(0.95), lat[-1] if lat else 0.0)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='musicutil',
+        description='Search and resolve songs in bulk. Reads queries or '
+        'song urls (one per line) and writes NDJSON records.')
+    parser.add_argument(
+        'input', nargs='?', default='-',
+        help="File with queries/urls, '-' for stdin [Default: -]")
+    parser.add_argument(
+        '-o', '--output', default='-',
+        help="NDJSON output file, '-' for stdout [Default: -]")
+    parser.add_argument(
+        '-s', '--source', default=SRC_DEFAULT,
+        help='Music source to use [Default: %(default)s]')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=8,
+        help='Number of parallel workers [Default: %(default)s]')
+    parser.add_argument(
+        '-m', '--max', type=int, default=1,
+        help='Search hits to resolve per query [Default: %(default)s]')
+    parser.add_argument(
+        '-i', '--info', action='store_true',
+        help='Also fetch song info (name, album, lyrics..)')
+    parser.add_argument(
+        '-r', '--resume', action='store_true',
+        help='Skip inputs already present in output file and append')
+    parser.add_argument(
+        '--transport', default='requests', choices=sorted(TRANSPORTS),
+        help='Http transport [Default: %(default)s]')
+    parser.add_argument(
+        '-p', '--parse-workers', type=int, default=0,
+        help='Parse pages in this many processes, 0 parses in the '
+        'fetching threads [Default: %(default)s]')
+    parser.add_argument(
+        '-t', '--timeout', type=float, default=30,
+        help='Http timeout in seconds [Default: %(default)s]')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    parse_pool = None
+    if args.parse_workers > 0:
+        parse_pool = ParsePool(args.parse_workers)
+
+    source = get_source(args.source)(
+        requests_session=True,
+        requests_timeout=args.timeout,
+        thread_safe=True,
+        transport=args.transport,
+        parse_pool=parse_pool)
+
+    done = read_done(args.output) if args.resume else set()
+
+    if args.output == '-':
+        fw = sys.stdout
+    else:
+        fw = open(args.output, 'a' if args.resume else 'w',
+                  encoding='utf-8')
+
+    write_lock = threading.Lock()
+    stats = Stats()
+
+    def work(line):
+        start = time.perf_counter()
+        record = {'input': line}
+        error = False
+        try:
+            record['results'] = resolve(source, line, args.max, args.info)
+        except Exception as e:
+            record['error'] = str(e)
+            error = True
+        stats.add(time.perf_counter() - start, error)
+
+        with write_lock:
+            fw.write(json.dumps(record, ensure_ascii=False) + '\n')
+            fw.flush()
+
+    jobs = max(1, args.jobs)
+    #Bound the queued inputs so huge input files are not
+    #loaded into memory at once.
+    slots = threading.BoundedSemaphore(jobs * 4)
+
+    def release(future):
+        slots.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for line in read_inputs(args.input):
+                if line in done:
+                    continue
+                slots.acquire()
+                pool.submit(work, line).add_done_callback(release)
+    finally:
+        if parse_pool:
+            parse_pool.close()
+        if fw is not sys.stdout:
+            fw.close()
+        print(stats.summary(), file=sys.stderr)
+
+    return 1 if stats.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
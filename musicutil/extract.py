@@ -0,0 +1,368 @@
+#Imports
+from collections import deque
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup as bs, element, NavigableString
+
+PARSER = 'html5lib'
+
+#Elements without end tag.
+_VOID = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img',
+                   'input', 'link', 'meta', 'param', 'source', 'track',
+                   'wbr'))
+#Elements whose end tag is implied by a sibling of the same name.
+_IMPLIED_END = frozenset(('li', 'p', 'tr', 'td', 'th', 'option', 'dt',
+                          'dd'))
+
+
+class Field:
+    """A value to extract from the document.
+
+       Args:
+            name: Key of the value in the record. If None then
+                  value is not stored (useful for scoping 'fields').
+            tag: Tag name to match.
+            attrs: (Optional) dict of attributes the tag must have.
+                   'class' matches if the value is one of the tag
+                   classes, other attributes must be equal.
+            get: What to extract from the matched tag.
+                 'string' => tag.string [Default]
+                 'texts'  => list of all strings inside the tag
+                 Strings are plain str, not bs4 strings (which
+                 keep, and pickle, the whole tree).
+                 '@attr'  => value of attribute 'attr'
+                 callable => get(tag)
+            multiple: if True, the values of all matching tags are
+                      stored in a list, otherwise only the first
+                      match is used.
+            fields: (Optional) Fields matched only inside (and on)
+                    the matched tag. Their values are stored in the
+                    same record.
+    """
+
+    def __init__(self, name, tag, attrs=None, get='string', multiple=False,
+                 fields=()):
+        self.name = name
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.get = get
+        self.multiple = multiple
+        self.fields = tuple(fields)
+
+    def matches(self, tag):
+        if tag.name != self.tag:
+            return False
+        for key, value in self.attrs.items():
+            actual = tag.get(key)
+            if actual is None:
+                return False
+            if key == 'class':
+                if value not in actual:
+                    return False
+            elif actual != value:
+                return False
+        return True
+
+    def value(self, tag):
+        if self.get == 'string':
+            string = tag.string
+            return None if string is None else str(string)
+        elif callable(self.get):
+            return self.get(tag)
+        elif self.get and self.get.startswith('@'):
+            return tag.get(self.get[1:])
+        return None
+
+
+class Group(Field):
+    """Fields repeated for every matching tag.
+
+       Each matching tag yields a new record (dict) of 'fields',
+       all of them collected in a list under 'name'.
+    """
+
+    def __init__(self, name, tag, attrs=None, fields=()):
+        super().__init__(name, tag, attrs, get=None, multiple=True,
+                         fields=fields)
+
+
+class Extractor:
+    """Extract all declared fields in a single pass over the tree.
+
+       Usage:-
+            rules = Extractor(
+                Field('title', 'h1'),
+                Group('links', 'a', fields=[Field('url', 'a', get='@href')]))
+            rules.extract(html)
+            => {'title': 'Hello', 'links': [{'url': '/a'}, {'url': '/b'}]}
+
+       Records only have keys for fields which matched, so a
+       missing key means the tag was not found.
+
+       'stream' extracts from markup fed in chunks instead, see
+       its docstring.
+    """
+
+    def __init__(self, *fields):
+        self.fields = fields
+
+    @staticmethod
+    def _open(field, node, record, scopes, sinks, used):
+        """Apply a matched field on node. Returns (scopes, sinks)
+           for the subtree of node."""
+        if isinstance(field, Group):
+            child = {}
+            record.setdefault(field.name, []).append(child)
+            return scopes + ((field.fields, child), ), sinks
+
+        if field.get == 'texts':
+            value = []
+            sinks = sinks + (value, )
+        else:
+            value = field.value(node)
+
+        if field.name:
+            if field.multiple:
+                record.setdefault(field.name, []).append(value)
+            else:
+                record[field.name] = value
+
+        if not field.multiple:
+            used.add((id(record), field))
+        if field.fields:
+            scopes = scopes + ((field.fields, record), )
+        return scopes, sinks
+
+    def extract(self, html):
+        """Returns a dict of all fields extracted from 'html'.
+
+           Args:
+                html: Markup string or an already parsed soup.
+        """
+        root = html if isinstance(html, element.Tag) else bs(html, PARSER)
+
+        result = {}
+        #Non multiple fields already matched, per record.
+        used = set()
+        #Stack of (node, active scopes, active text sinks). A scope is
+        #a (fields, record) pair whose fields are matched in subtree.
+        stack = [(root, (((self.fields, result), )), ())]
+
+        while stack:
+            node, scopes, sinks = stack.pop()
+
+            if isinstance(node, NavigableString):
+                for sink in sinks:
+                    sink.append(str(node))
+                continue
+            if not isinstance(node, element.Tag):
+                continue
+
+            #Scopes opened on this node are also matched on it.
+            i = 0
+            while i < len(scopes):
+                fields, record = scopes[i]
+                for field in fields:
+                    if (id(record), field) in used:
+                        continue
+                    if field.matches(node):
+                        scopes, sinks = self._open(field, node, record,
+                                                   scopes, sinks, used)
+                i += 1
+
+            stack.extend((child, scopes, sinks)
+                         for child in reversed(node.contents))
+        return result
+
+    def stream(self, chunks):
+        """Extract incrementally from markup given in chunks.
+
+           Records of groups stored in the top level result are
+           yielded as soon as their tag is closed and then
+           forgotten, as is the rest of the document, so memory
+           does not grow with the page size.
+
+           Callable 'get' receives a light weight tag having only
+           'name', 'attrs' and 'get'.
+
+           Args:
+                chunks: Iterable of markup strings.
+
+           Returns:
+                A generator object of (group name, record) tuples.
+        """
+        parser = _StreamParser(self)
+        for chunk in chunks:
+            parser.feed(chunk)
+            while parser.ready:
+                yield parser.ready.popleft()
+        parser.close()
+        while parser.ready:
+            yield parser.ready.popleft()
+
+
+class _StartTag:
+    """Start tag seen by the streaming parser, enough of the bs4
+       Tag interface for Field.matches and Field.value."""
+
+    __slots__ = ('name', 'attrs')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = {}
+        for key, value in attrs:
+            if key == 'class':
+                value = (value or '').split()
+            self.attrs[key] = value
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+
+class _Frame:
+    """An open element of the streaming parser."""
+
+    __slots__ = ('name', 'scopes', 'sinks', 'children', 'string',
+                 'strings', 'groups')
+
+    def __init__(self, name, scopes, sinks):
+        self.name = name
+        self.scopes = scopes
+        self.sinks = sinks
+        #For tag.string: number of children and string of the last.
+        self.children = 0
+        self.string = None
+        #(record, name, index) waiting for the string of this tag.
+        self.strings = []
+        #Top level group records to yield when this tag closes.
+        self.groups = []
+
+
+class _StreamParser(HTMLParser):
+
+    def __init__(self, extractor):
+        super().__init__(convert_charrefs=True)
+        self.result = {}
+        self.ready = deque()
+        self._text = []
+        #Scopes are (fields, record, fields of record already used),
+        #the used set lives as long as the record.
+        self._stack = [_Frame(None, ((extractor.fields, self.result, set()),
+                                     ), ())]
+
+    def _add_text(self, text):
+        top = self._stack[-1]
+        for sink in top.sinks:
+            sink.append(text)
+        top.children += 1
+        top.string = text
+
+    def _flush_text(self):
+        #Text of a node may come in many pieces, join them first.
+        if self._text:
+            text = ''.join(self._text)
+            self._text = []
+            self._add_text(text)
+
+    def _open(self, field, tag, record, used, frame):
+        if isinstance(field, Group):
+            child = {}
+            if record is self.result:
+                frame.groups.append((field.name, child))
+            else:
+                record.setdefault(field.name, []).append(child)
+            frame.scopes = frame.scopes + ((field.fields, child, set()), )
+            return
+
+        string = field.get == 'string'
+        if field.get == 'texts':
+            value = []
+            frame.sinks = frame.sinks + (value, )
+        elif string:
+            value = None
+        else:
+            value = field.value(tag)
+
+        if field.name:
+            index = None
+            if field.multiple:
+                values = record.setdefault(field.name, [])
+                index = len(values)
+                values.append(value)
+            else:
+                record[field.name] = value
+            if string:
+                frame.strings.append((record, field.name, index))
+
+        if not field.multiple:
+            used.add(field)
+        if field.fields:
+            frame.scopes = frame.scopes + ((field.fields, record, used), )
+
+    def _close(self, frame):
+        string = frame.string if frame.children == 1 else None
+        for record, name, index in frame.strings:
+            if index is None:
+                record[name] = string
+            else:
+                record[name][index] = string
+        self.ready.extend(frame.groups)
+
+        parent = self._stack[-1]
+        parent.children += 1
+        parent.string = string
+
+    def handle_starttag(self, name, attrs):
+        self._flush_text()
+        if name in _IMPLIED_END and self._stack[-1].name == name:
+            self._close(self._stack.pop())
+
+        tag = _StartTag(name, attrs)
+        parent = self._stack[-1]
+        frame = _Frame(name, parent.scopes, parent.sinks)
+
+        #Scopes opened on this tag are also matched on it.
+        i = 0
+        while i < len(frame.scopes):
+            fields, record, used = frame.scopes[i]
+            for field in fields:
+                if field in used:
+                    continue
+                if field.matches(tag):
+                    self._open(field, tag, record, used, frame)
+            i += 1
+
+        if name in _VOID:
+            self._close(frame)
+        else:
+            self._stack.append(frame)
+
+    def handle_startendtag(self, name, attrs):
+        self.handle_starttag(name, attrs)
+        if name not in _VOID:
+            self.handle_endtag(name)
+
+    def handle_endtag(self, name):
+        self._flush_text()
+        #Stray end tags are ignored, unclosed children are closed.
+        if not any(frame.name == name for frame in self._stack[1:]):
+            return
+        while True:
+            frame = self._stack.pop()
+            self._close(frame)
+            if frame.name == name:
+                break
+
+    def handle_data(self, data):
+        self._text.append(data)
+
+    def handle_comment(self, data):
+        #Comments are strings too for bs4.
+        self._flush_text()
+        self._add_text(data)
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        while len(self._stack) > 1:
+            self._close(self._stack.pop())
@@ -0,0 +1,198 @@
+#Imports
+import time
+import socket
+import logging
+import threading
+from urllib.parse import urlparse
+
+_LOG = logging.getLogger(__name__)
+
+_MONITOR = None
+_MONITOR_LOCK = threading.Lock()
+
+#host, port -> (up, checked time) for check_host.
+_CHECKS = {}
+_CHECKS_LOCK = threading.Lock()
+
+
+def probe_host(host, port, timeout=3):
+    """Open (and close) a tcp connection to host.
+
+       Returns:
+            Connect latency in seconds or None if host is down.
+    """
+    start = time.perf_counter()
+    try:
+        s = socket.create_connection((host, port), timeout)
+        s.close()
+    except OSError:
+        return None
+    return time.perf_counter() - start
+
+
+def check_host(host, port, timeout=2, ttl=30):
+    """Same as probe_host but returns True/False, and the result
+       is cached for 'ttl' seconds."""
+    key = (host, port)
+    now = time.monotonic()
+    with _CHECKS_LOCK:
+        up, checked = _CHECKS.get(key, (None, None))
+    if checked is not None and now - checked < ttl:
+        return up
+    up = probe_host(host, port, timeout) is not None
+    with _CHECKS_LOCK:
+        _CHECKS[key] = (up, time.monotonic())
+    return up
+
+
+def host_port(url):
+    """Returns (host, port) of an url."""
+    url = urlparse(url)
+    return url.hostname, url.port or (443 if url.scheme == 'https' else 80)
+
+
+class HostState:
+    """Last probe result of a host."""
+
+    def __init__(self, up, latency, checked):
+        self.up = up
+        self.latency = latency
+        self.checked = checked
+
+    def age(self):
+        return time.monotonic() - self.checked
+
+
+class HealthMonitor:
+    """Probe source hosts in background and cache their state.
+
+       Args:
+            hosts: dict of name -> (host, port) to watch [Default:
+                   hosts of all registered sources]
+            interval: Seconds between background probes.
+            ttl: Seconds a probe result is considered fresh.
+            timeout: Connect timeout of a probe.
+    """
+
+    def __init__(self, hosts=None, interval=30, ttl=60, timeout=3):
+        if hosts is None:
+            hosts = self.source_hosts()
+        self.hosts = dict(hosts)
+        self.interval = interval
+        self.ttl = ttl
+        self.timeout = timeout
+        self._states = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def source_hosts():
+        """Returns (host, port) of every registered source."""
+        try:
+            from .MusicSource import SOURCES
+        except (ModuleNotFoundError, ImportError):
+            from MusicSource import SOURCES
+        return {
+            name: host_port(source._PREFIX)
+            for name, source in SOURCES.items() if hasattr(source, '_PREFIX')
+        }
+
+    def add(self, name, host, port=80):
+        with self._lock:
+            self.hosts[name] = (host, port)
+
+    def probe(self, name):
+        """Probe a host now (blocking) and returns its HostState."""
+        try:
+            host, port = self.hosts[name]
+            latency = probe_host(host, port, self.timeout)
+            state = HostState(latency is not None, latency, time.monotonic())
+            with self._lock:
+                self._states[name] = state
+            return state
+        finally:
+            with self._lock:
+                self._refreshing.discard(name)
+
+    def probe_all(self):
+        for name in list(self.hosts):
+            self.probe(name)
+
+    def state(self, name):
+        """Returns the cached HostState of name or None."""
+        with self._lock:
+            return self._states.get(name)
+
+    def _refresh(self, name):
+        """Probe name in a background thread, once at a time."""
+        with self._lock:
+            if name in self._refreshing or name not in self.hosts:
+                return
+            self._refreshing.add(name)
+        threading.Thread(target=self._probe_logged, args=(name, ),
+                         daemon=True).start()
+
+    def _probe_logged(self, name):
+        try:
+            self.probe(name)
+        except Exception:
+            _LOG.exception('Health probe of %r failed', name)
+
+    def is_available(self, name, default=True):
+        """Non blocking check of a host.
+
+           Returns the cached state if it is fresh. Otherwise a
+           probe is started in background and the last known
+           state (or 'default' if never probed) is returned.
+        """
+        state = self.state(name)
+        if state is None or state.age() > self.ttl:
+            self._refresh(name)
+        if state is None:
+            return default
+        return state.up
+
+    def _run(self):
+        while not self._stop.is_set():
+            for name in list(self.hosts):
+                if self._stop.is_set():
+                    break
+                #Keep probing the other hosts (and later rounds) if
+                #one probe fails unexpectedly.
+                try:
+                    self.probe(name)
+                except Exception:
+                    _LOG.exception('Health probe of %r failed', name)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start probing all hosts every 'interval' seconds."""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def get_monitor():
+    """Returns the process wide HealthMonitor of registered
+       sources, started on first use."""
+    global _MONITOR
+    with _MONITOR_LOCK:
+        if _MONITOR is None:
+            _MONITOR = HealthMonitor().start()
+        return _MONITOR
+
+
+def is_source_available(name, default=True):
+    """Non blocking check if the host of source 'name' is up.
+
+       See HealthMonitor.is_available.
+    """
+    return get_monitor().is_available(name, default)
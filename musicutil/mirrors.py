@@ -0,0 +1,241 @@
+#Imports
+import math
+import time
+import threading
+from urllib.parse import urlparse
+
+import requests
+
+try:
+    from .util import convert_size
+except (ModuleNotFoundError, ImportError):
+    from util import convert_size
+
+#Size assumed for download options without a (parsable) size.
+_DEFAULT_SIZE = 5 * 1024**2
+#Lowest throughput estimate (bytes/sec), keeps costs finite.
+_MIN_THROUGHPUT = 1024
+
+
+def host_of(url):
+    return urlparse(url).netloc.lower()
+
+
+def size_in_bytes(size):
+    """Returns size like '3.5 MB' in bytes or None."""
+    if size is None:
+        return None
+    if isinstance(size, (int, float)):
+        return size
+    try:
+        return convert_size(size, 'b')
+    except (ValueError, TypeError):
+        return None
+
+
+class HostStats:
+    """Rolling (exponentially weighted) estimate of throughput
+       and latency of a single host."""
+
+    def __init__(self, throughput, latency):
+        self.throughput = throughput
+        self.latency = latency
+        self.samples = 0
+        self.updated = None
+
+    def update(self, alpha, throughput=None, latency=None):
+        #First real sample replaces the default guess.
+        if not self.samples:
+            alpha = 1.0
+        if throughput is not None:
+            self.throughput += alpha * (throughput - self.throughput)
+            self.throughput = max(self.throughput, _MIN_THROUGHPUT)
+        if latency is not None:
+            self.latency += alpha * (latency - self.latency)
+        self.samples += 1
+        self.updated = time.time()
+
+
+class MirrorSelector:
+    """Pick the best download option using quality preference
+       and the measured speed of every data host.
+
+       Quality comes first: each step below the best quality
+       costs 'quality_weight'. A host only adds a penalty when it
+       is congested, that is at least 'slow_factor' times slower
+       than the fastest host among the options. The penalty is
+       log2 of the slowdown, so a host 4x slower costs 2 steps.
+       If 'target_time' is set, options estimated to take longer
+       (latency + size / throughput) cost one more step for every
+       'target_time' seconds over it. The cheapest option wins.
+
+       When all options are on one host (the usual result of
+       download_details) or no host is congested, the best
+       quality is picked. Hosts not seen yet get the default
+       estimate, so they are still tried.
+
+       Args:
+            quality_weight: Cost of one quality step. 0 means only
+                            speed matters, a large value means
+                            quality always wins.
+            slow_factor: Slowdown (against the fastest option host)
+                         from which a host is penalized.
+            target_time: (Optional) Seconds a download should take
+                         at most before it is penalized.
+            alpha: Weight of a new sample in rolling estimates.
+            default_throughput: Assumed bytes/sec of unknown hosts.
+            default_latency: Assumed latency (sec) of unknown hosts.
+    """
+
+    def __init__(self,
+                 quality_weight=1.0,
+                 slow_factor=2.0,
+                 target_time=None,
+                 alpha=0.3,
+                 default_throughput=512 * 1024,
+                 default_latency=0.5):
+        self.quality_weight = quality_weight
+        self.slow_factor = slow_factor
+        self.target_time = target_time
+        self.alpha = alpha
+        self.default_throughput = default_throughput
+        self.default_latency = default_latency
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = HostStats(self.default_throughput,
+                                          self.default_latency)
+        return self._hosts[host]
+
+    def stats(self, url):
+        """Returns (throughput, latency) estimate of the url host."""
+        with self._lock:
+            stats = self._stats(host_of(url))
+            return stats.throughput, stats.latency
+
+    def record_transfer(self, url, nbytes, seconds, latency=None):
+        """Record a finished (or partial) download from url.
+
+           Args:
+                nbytes: Bytes received.
+                seconds: Time taken to receive them.
+                latency: (Optional) Time to first byte.
+        """
+        if seconds <= 0:
+            return
+        if nbytes <= 0:
+            #Nothing received (like an empty response) is a failure,
+            #not a measure of throughput.
+            self.record_failure(url)
+            return
+        with self._lock:
+            self._stats(host_of(url)).update(
+                self.alpha, throughput=nbytes / seconds, latency=latency)
+
+    def record_latency(self, url, seconds):
+        with self._lock:
+            self._stats(host_of(url)).update(self.alpha, latency=seconds)
+
+    def record_failure(self, url):
+        """Penalize the host of a failed download or probe."""
+        with self._lock:
+            stats = self._stats(host_of(url))
+            stats.update(
+                self.alpha,
+                throughput=stats.throughput / 2,
+                latency=stats.latency * 2 + 1)
+
+    def probe(self, url, timeout=5):
+        """Measure the latency of url host with a HEAD request.
+
+           Returns:
+                Latency in seconds or None if the probe failed.
+        """
+        start = time.perf_counter()
+        try:
+            requests.head(url, timeout=timeout, allow_redirects=False)
+        except requests.RequestException:
+            self.record_failure(url)
+            return None
+        latency = time.perf_counter() - start
+        self.record_latency(url, latency)
+        return latency
+
+    def estimate(self, url, size):
+        """Returns estimated seconds to download size from url."""
+        throughput, latency = self.stats(url)
+        size = size_in_bytes(size)
+        if size is None:
+            size = _DEFAULT_SIZE
+        return latency + size / throughput
+
+    def cost(self, url, size, rank, best_throughput=None):
+        """Cost of a download option, see the class docstring.
+
+           Args:
+                rank: Quality steps below the best quality.
+                best_throughput: (Optional) Throughput of the
+                                 fastest host among the options.
+        """
+        throughput = self.stats(url)[0]
+        cost = self.quality_weight * rank
+
+        if best_throughput:
+            slowdown = best_throughput / throughput
+            if slowdown >= self.slow_factor:
+                cost += math.log2(slowdown)
+
+        if self.target_time:
+            over = self.estimate(url, size) - self.target_time
+            if over > 0:
+                cost += over / self.target_time
+        return cost
+
+    def rank(self, details, qualities=None, max_size=None):
+        """Sort download options from best to worst.
+
+           Args:
+                details: List of (quality, url, size) as returned by
+                         source.download_details.
+                qualities: Qualities from best to lowest [Default:
+                           order of the quality enum]
+                max_size: (Optional) Skip options larger than this
+                          many bytes (or size string like '10 MB')
+
+           Returns:
+                A list of (cost, (quality, url, size))
+        """
+        details = [d for d in details if d[1]]
+        if qualities is None:
+            qualities = next((tuple(type(d[0])) for d in details
+                              if d[0] is not None), ())
+        qualities = list(qualities)
+        max_size = size_in_bytes(max_size)
+
+        if max_size is not None:
+            details = [
+                d for d in details if size_in_bytes(d[2]) is None
+                or size_in_bytes(d[2]) <= max_size
+            ]
+        best_throughput = max(
+            (self.stats(d[1])[0] for d in details), default=None)
+
+        ranked = []
+        for detail in details:
+            quality, url, size = detail
+            if quality in qualities:
+                rank = qualities.index(quality)
+            else:
+                rank = len(qualities)
+            cost = self.cost(url, size, rank, best_throughput)
+            ranked.append((cost, self.estimate(url, size), detail))
+        #Equal costs go to the faster download.
+        ranked.sort(key=lambda item: item[:2])
+        return [(cost, detail) for cost, _, detail in ranked]
+
+    def select(self, details, qualities=None, max_size=None):
+        """Returns the best (quality, url, size) or None."""
+        ranked = self.rank(details, qualities, max_size)
+        return ranked[0][1] if ranked else None
@@ -0,0 +1,76 @@
+#Imports
+import os
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _run(func, html, args):
+    """Run a scraper in worker, generators are turned into lists
+       so only plain result tuples are sent back."""
+    result = func(html, *args)
+    if isinstance(result, types.GeneratorType):
+        result = list(result)
+    return result
+
+
+def _run_packed(packed):
+    return _run(*packed)
+
+
+class ParsePool:
+    """Offload html parsing to a pool of processes.
+
+       Fetching stays on the calling threads, only the html goes to
+       a worker and the compact scraped result comes back, so
+       parsing is not limited by the GIL.
+
+       Usage:-
+            pool = ParsePool(workers=4)
+            source = chiasenhac_vn(thread_safe=True, parse_pool=pool)
+
+       Sources send every fetched page as its own task.
+
+       Args:
+            workers: Number of processes [Default: os.cpu_count()]
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(self, func, html, *args):
+        """Parse html with func(html, *args) in a worker.
+
+           Args:
+                func: A module level function or staticmethod of a
+                      source (it must be picklable).
+
+           Returns:
+                A concurrent.futures.Future
+        """
+        return self._executor.submit(_run, func, html, args)
+
+    def parse(self, func, html, *args):
+        """Same as 'submit' but waits for the result."""
+        return self.submit(func, html, *args).result()
+
+    def map(self, func, htmls, *args, chunksize=1):
+        """Parse many pages already fetched, 'chunksize' pages per
+           worker task.
+
+           Returns:
+                A list of results in order of htmls.
+        """
+        return list(self._executor.map(
+            _run_packed,
+            ((func, html, args) for html in htmls),
+            chunksize=chunksize))
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,295 @@
+#Imports
+import os
+import re
+import json
+import time
+import threading
+import unicodedata
+import warnings
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+
+try:
+    from .util import prompt_for_spotify_token
+except (ModuleNotFoundError, ImportError):
+    from util import prompt_for_spotify_token
+
+#A track to look for. 'artists' is a tuple of artist names.
+Track = namedtuple('Track', ('name', 'artists', 'album'))
+
+#Spotify access tokens are valid for an hour, keep them a bit less.
+TOKEN_TTL = 50 * 60
+
+_TOKENS = {}
+_TOKENS_LOCK = threading.Lock()
+
+#Parts of titles which differ between sources, like
+#"(feat. X)", "[Live]" or "- Remastered 2011".
+_RE_EXTRA = re.compile(r'\(.*?\)|\[.*?\]|\s-\s.*$')
+_RE_NON_WORD = re.compile(r'[^\w]+')
+
+
+def get_spotify_token(username, scope=None, **kwargs):
+    """Returns a spotify token, prompting the user only when
+       there is no valid token cached in this process.
+
+       Args:
+            username: Spotify username
+            scope: Desired scope of the token
+            **kwargs: passed to util.prompt_for_spotify_token
+    """
+    key = (username, scope)
+    with _TOKENS_LOCK:
+        token, expire = _TOKENS.get(key, (None, 0))
+    if token and time.time() < expire:
+        return token
+
+    #Prompting may wait on the user, do not block other lookups.
+    token = prompt_for_spotify_token(username, scope, **kwargs)
+    if token:
+        with _TOKENS_LOCK:
+            _TOKENS[key] = (token, time.time() + TOKEN_TTL)
+    return token
+
+
+def _track_from_dict(item):
+    """Build a Track from a spotify track object, a playlist item
+       (having 'track' key) or a flat {'name', 'artist'} dict."""
+    if 'track' in item and isinstance(item['track'], dict):
+        item = item['track']
+
+    artists = item.get('artists') or item.get('artist') or ()
+    if isinstance(artists, str):
+        artists = (artists, )
+    artists = tuple(a['name'] if isinstance(a, dict) else a for a in artists)
+
+    album = item.get('album')
+    if isinstance(album, dict):
+        album = album.get('name')
+    return Track(item.get('name'), artists, album)
+
+
+def tracks_from_spotify(client, playlist_id, username=None):
+    """Fetch all tracks of a spotify playlist.
+
+       Args:
+            client: A spotipy.Spotify object (or anything with the
+                    same 'user_playlist_tracks' and 'next' methods)
+            playlist_id: Id or uri of the playlist
+            username: Owner of the playlist
+
+       Returns:
+            A list of Track
+    """
+    tracks = []
+    page = client.user_playlist_tracks(username, playlist_id)
+    while page:
+        tracks.extend(_track_from_dict(item) for item in page['items']
+                      if item and item.get('track') is not None)
+        page = client.next(page) if page.get('next') else None
+    return tracks
+
+
+def tracks_from_json(data):
+    """Load tracks from a local JSON export.
+
+       Args:
+            data: Path of a json file or already loaded json. It can
+                  be a list of tracks or a playlist object having
+                  'items' (or 'tracks': {'items': []}).
+
+       Returns:
+            A list of Track
+    """
+    if isinstance(data, str):
+        with open(data, 'r', encoding='utf-8') as fr:
+            data = json.load(fr)
+
+    if isinstance(data, dict):
+        data = data.get('tracks', data)
+        if isinstance(data, dict):
+            data = data.get('items', [])
+    return [_track_from_dict(item) for item in data if item]
+
+
+def normalize(text):
+    """Lower case the text and strip accents, extra title parts
+       and punctuation, for fuzzy comparison."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = _RE_EXTRA.sub(' ', text.lower())
+    return _RE_NON_WORD.sub(' ', text).strip()
+
+
+def similarity(a, b):
+    """Returns a ratio in [0, 1] of how similar two normalized
+       strings are."""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b)
+    #Cheap upper bounds first, most of the hits are far off.
+    if matcher.real_quick_ratio() < 0.5 or matcher.quick_ratio() < 0.5:
+        return 0.0
+    return matcher.ratio()
+
+
+class Matcher:
+    """Fuzzy title/artist matcher for picking the best search hit.
+
+       Args:
+            threshold: Minimum score of an acceptable match.
+            title_weight: Weight of title similarity, the rest is
+                          given to the artist similarity.
+    """
+
+    def __init__(self, threshold=0.6, title_weight=0.7):
+        self.threshold = threshold
+        self.title_weight = title_weight
+
+    def score(self, track, song, artist):
+        """Score of a search hit (song, artist) for track."""
+        title_score = similarity(normalize(track.name), normalize(song))
+
+        artist = normalize(artist)
+        artist_score = 0.0
+        for name in track.artists:
+            name = normalize(name)
+            if name and name in artist:
+                artist_score = 1.0
+                break
+            artist_score = max(artist_score, similarity(name, artist))
+
+        if not track.artists:
+            return title_score
+        return (self.title_weight * title_score +
+                (1 - self.title_weight) * artist_score)
+
+    def best(self, track, hits):
+        """Returns (score, hit) of the best hit or None if no hit
+           reaches the threshold.
+
+           Args:
+                track: Track to match
+                hits: Iterable of (song, artist, url) tuples as
+                      returned by source.search
+        """
+        best = None
+        for hit in hits:
+            score = self.score(track, hit[0], hit[1])
+            if score >= self.threshold and (not best or score > best[0]):
+                best = (score, hit)
+        return best
+
+
+class MatchCache:
+    """Thread safe cache of track -> match, optionally saved in
+       a json file so later runs skip already resolved tracks."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as fr:
+                    self._data = json.load(fr)
+            except ValueError:
+                self._data = {}
+
+    @staticmethod
+    def key(track):
+        return '{0} - {1}'.format(
+            normalize(track.name), normalize(', '.join(track.artists)))
+
+    def get(self, track):
+        with self._lock:
+            return self._data.get(self.key(track))
+
+    def __contains__(self, track):
+        with self._lock:
+            return self.key(track) in self._data
+
+    def set(self, track, match):
+        with self._lock:
+            self._data[self.key(track)] = match
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path, 'w', encoding='utf-8') as fw:
+                json.dump(self._data, fw, ensure_ascii=False)
+
+
+def resolve_track(source, track, matcher=None, max=5, details=True):
+    """Search a single track on source and returns the best match.
+
+       Returns:
+            A dict like {'song', 'artist', 'url', 'score',
+            'downloads'} or None if nothing matched.
+    """
+    matcher = matcher or Matcher()
+    query = ' '.join(filter(None, (track.name, ) + track.artists[:1]))
+    best = matcher.best(track, source.search(query, max))
+    if not best:
+        return None
+
+    score, (song, artist, url) = best
+    match = {'song': song, 'artist': artist, 'url': url,
+             'score': round(score, 3)}
+    if details and url:
+        match['downloads'] = source.download_details(
+            url, json_serializable=True)
+    return match
+
+
+def resolve_tracks(source, tracks, workers=8, max=5, details=True,
+                   matcher=None, cache=None):
+    """Resolve many tracks to source songs concurrently.
+
+       Args:
+            source: A music source, shared by all the workers so it
+                    should be created with thread_safe=True.
+            tracks: Iterable of Track
+            workers: Number of concurrent lookups
+            max: Search hits to consider per track
+            details: if True, attach download details of the match
+            matcher: A Matcher [Default: Matcher()]
+            cache: A MatchCache, matched tracks are looked up and
+                   stored in it.
+
+       Returns:
+            A list of (track, match, error) in order of tracks.
+            'match' is None for tracks without an acceptable hit
+            and for failed lookups, 'error' is the exception of a
+            failed lookup (network, parsing) or None. A warning
+            with the number of failed lookups is issued if any.
+    """
+    matcher = matcher or Matcher()
+    cache = cache if cache is not None else MatchCache()
+
+    def work(track):
+        if track in cache:
+            return track, cache.get(track), None
+        try:
+            match = resolve_track(source, track, matcher, max, details)
+        except Exception as e:
+            #Failed lookups are not cached, so they are retried.
+            return track, None, e
+        cache.set(track, match)
+        return track, match, None
+
+    with ThreadPoolExecutor(max_workers=workers if workers > 0 else 1) as pool:
+        results = list(pool.map(work, tracks))
+    cache.save()
+
+    failed = sum(1 for result in results if result[2] is not None)
+    if failed:
+        warnings.warn('{0} of {1} tracks failed to resolve.'.format(
+            failed, len(results)))
+    return results
@@ -0,0 +1,180 @@
+#Imports
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LRUCache:
+    """Thread safe dict keeping at most 'size' recently used items."""
+
+    def __init__(self, size=64):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class Prefetcher:
+    """Speculatively fetch the top search hits of a source.
+
+       After every 'search' the song pages of the first 'top_k'
+       hits are fetched and parsed in background, so following
+       'song_info'/'download_details' calls for them are served
+       from cache (or wait on the fetch already in flight).
+
+       A new search in the same 'session' cancels the prefetches
+       of the previous one which did not start yet (running ones
+       can not be interrupted, their pages are still cached).
+
+       Usage:-
+            source = chiasenhac_vn(thread_safe=True)
+            prefetcher = Prefetcher(source)
+            hits = prefetcher.search('ride', session=user_id)
+            prefetcher.download_details(hits[0][2])  # instant
+
+       Args:
+            source: Music source (created with thread_safe=True).
+            top_k: Number of top hits to prefetch.
+            workers: Maximum concurrent prefetches.
+            budget: Maximum queued + running prefetches, extra ones
+                    are skipped.
+            cache_size: Number of parsed pages kept.
+    """
+
+    def __init__(self, source, top_k=3, workers=2, budget=8,
+                 cache_size=64):
+        self.source = source
+        self.top_k = top_k
+        self.budget = budget
+        self.cache = LRUCache(cache_size)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        #Reentrant, done callbacks may run while it is held.
+        self._lock = threading.RLock()
+        self._inflight = {}
+        self._generations = {}
+        self._pending = {}
+        self._outstanding = 0
+
+    def _url(self, url):
+        """Absolute url of a song, used as key of its page."""
+        if url and not url.startswith('http'):
+            url = self.source.prefix + url
+        return url
+
+    def _fetch_page(self, url):
+        """Returns (song_info, download_details) of a song url,
+           both parsed from a single fetch of the page."""
+        source = self.source
+        html = source._get(url)
+        return (source._parse(source._scrap_song_info, html),
+                source._parse(source._scrap_download_details, html))
+
+    def _is_current(self, session, generation):
+        with self._lock:
+            return self._generations.get(session) == generation
+
+    def _prefetch(self, url, session, generation):
+        if not self._is_current(session, generation) or url in self.cache:
+            return None
+        page = self._fetch_page(url)
+        self.cache.put(url, page)
+        return page
+
+    def _done(self, url, future):
+        with self._lock:
+            self._outstanding -= 1
+            if self._inflight.get(url) is future:
+                del self._inflight[url]
+
+    def cancel(self, session=None):
+        """Cancel prefetches of session not started yet."""
+        with self._lock:
+            self._generations[session] = self._generations.get(
+                session, 0) + 1
+            for future in self._pending.pop(session, ()):
+                future.cancel()
+
+    def search(self, query, max=None, session=None):
+        """Search query on source and start prefetching top hits.
+
+           Returns:
+                A list of (song, artist, url) tuples.
+        """
+        self.cancel(session)
+        if max is None:
+            hits = list(self.source.search(query))
+        else:
+            hits = list(self.source.search(query, max))
+
+        with self._lock:
+            generation = self._generations[session]
+            futures = []
+            for hit in hits[:self.top_k]:
+                url = self._url(hit[2])
+                if (not url or url in self._inflight or url in self.cache
+                        or self._outstanding >= self.budget):
+                    continue
+                future = self._executor.submit(self._prefetch, url, session,
+                                               generation)
+                self._outstanding += 1
+                self._inflight[url] = future
+                futures.append(future)
+                future.add_done_callback(
+                    lambda f, url=url: self._done(url, f))
+            self._pending[session] = futures
+        return hits
+
+    def _page(self, url):
+        url = self._url(url)
+        page = self.cache.get(url)
+        if page is not None:
+            return page
+
+        with self._lock:
+            future = self._inflight.get(url)
+        if future is not None:
+            try:
+                page = future.result()
+            except Exception:
+                #Cancelled or failed prefetch, fetch it again below.
+                page = None
+            if page is not None:
+                return page
+
+        page = self._fetch_page(url)
+        self.cache.put(url, page)
+        return page
+
+    def song_info(self, url):
+        """Same as source.song_info(url), served from prefetched
+           pages when possible."""
+        return self._page(url)[0]
+
+    def download_details(self, url):
+        """Same as source.download_details(url), served from
+           prefetched pages when possible."""
+        return self._page(url)[1]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,122 @@
+#Imports
+import asyncio
+import copy
+import functools
+import inspect
+import threading
+from collections.abc import Iterator
+
+
+class _Call:
+    """A call in flight, waited on by duplicate callers."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce duplicate concurrent calls.
+
+       While a call for a key is in flight, other calls with the
+       same key wait for it and get its result (or exception)
+       instead of running again. Results are not cached once the
+       call finished.
+
+       Usage:-
+            flight = SingleFlight()
+            flight.do(('GET', url), fetch, url)
+            await flight.do_async(('GET', url), async_fetch, url)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """Run func(*args, **kwargs) unless a call for key is
+           already in flight in another thread."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    async def do_async(self, key, func, *args, **kwargs):
+        """Await func(*args, **kwargs) unless a call for key is
+           already in flight on the running event loop."""
+        task_key = (asyncio.get_running_loop(), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._tasks[task_key] = task
+            task.add_done_callback(
+                lambda t: self._tasks.pop(task_key, None))
+        #Shield, so one cancelled waiter does not cancel the others.
+        return await asyncio.shield(task)
+
+
+def coalesced(method):
+    """Decorator for source methods coalescing duplicate calls
+       when the source was created with coalesce='call'.
+
+       Calls are the same when their arguments are, once bound to
+       the method signature with defaults applied, so search('q')
+       and search(query='q', max=10) are coalesced. Calls with
+       unhashable arguments are not coalesced.
+
+       Iterator results (like of search) are turned into lists, as
+       they are shared by all the callers. Every caller gets its
+       own shallow copy of list and dict results. Streaming calls
+       (stream=True) are not coalesced, listing them would wait
+       for the whole stream.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.coalesce != 'call':
+            return method(self, *args, **kwargs)
+
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        if bound.arguments.get('stream'):
+            return method(self, *args, **kwargs)
+        key = (method.__name__, ) + tuple(bound.arguments.items())[1:]
+        try:
+            hash(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+
+        def call():
+            result = method(self, *args, **kwargs)
+            if isinstance(result, Iterator):
+                result = list(result)
+            return result
+
+        result = self._flight.do(key, call)
+        if isinstance(result, (list, dict)):
+            result = copy.copy(result)
+        return result
+
+    return wrapper
@@ -0,0 +1,272 @@
+#Imports
+import os
+import struct
+
+VENDOR = b'musicutil'
+
+#ID3v2 frame ids / vorbis comment names of song info fields.
+_ID3_FRAMES = (('name', 'TIT2'), ('artist', 'TPE1'), ('album', 'TALB'),
+               ('year', 'TYER'))
+_VORBIS_NAMES = (('name', 'TITLE'), ('artist', 'ARTIST'),
+                 ('album', 'ALBUM'), ('year', 'DATE'), ('lyrics', 'LYRICS'))
+#ID3v2.4 replaced the year frame with the recording time.
+_ID3V4_FRAMES = {'TYER': 'TDRC'}
+
+_FLAC_VORBIS_COMMENT = 4
+
+
+def tag_format(path):
+    """Returns 'mp3', 'flac' or None (not supported) from the
+       extension of path."""
+    ext = os.path.splitext(path.split('?')[0])[1].lower()
+    return {'.mp3': 'mp3', '.flac': 'flac'}.get(ext)
+
+
+def _song_dict(info):
+    """Song info as returned by song_info (tuple or dict) to
+       dict, lyrics joined in a single string."""
+    if not isinstance(info, dict):
+        info = dict(zip(('name', 'artist', 'album', 'year', 'lyrics'), info))
+    info = {k: v for k, v in info.items() if v}
+    if isinstance(info.get('lyrics'), (list, tuple)):
+        info['lyrics'] = '\n'.join(info['lyrics']).strip()
+    return {k: str(v).strip() for k, v in info.items() if v}
+
+
+def _syncsafe(n):
+    return bytes(((n >> 21) & 0x7f, (n >> 14) & 0x7f, (n >> 7) & 0x7f,
+                  n & 0x7f))
+
+
+def _unsyncsafe(data):
+    return ((data[0] & 0x7f) << 21) | ((data[1] & 0x7f) << 14) | \
+        ((data[2] & 0x7f) << 7) | (data[3] & 0x7f)
+
+
+def _id3_frame(frame_id, data, version=3):
+    size = _syncsafe(len(data)) if version == 4 else \
+        struct.pack('>I', len(data))
+    return frame_id.encode('ascii') + size + b'\x00\x00' + data
+
+
+def _id3_frame_ids(info, version=3):
+    """Frame ids written by build_id3 for (normalized) info."""
+    ids = []
+    for key, frame_id in _ID3_FRAMES:
+        if key in info:
+            if version == 4:
+                frame_id = _ID3V4_FRAMES.get(frame_id, frame_id)
+            ids.append((key, frame_id))
+    return ids
+
+
+def build_id3(info, version=3, frames=()):
+    """Returns ID3v2 tag (UTF-16 text frames) for song info.
+
+       Args:
+            info: Song info (tuple or dict from song_info).
+            version: ID3v2 major version, 3 or 4.
+            frames: Raw frames (of the same version) to add after
+                    the song info ones.
+    """
+    info = _song_dict(info)
+    data = b''
+    for key, frame_id in _id3_frame_ids(info, version):
+        data += _id3_frame(frame_id, b'\x01' + info[key].encode('utf-16'),
+                           version)
+    if 'lyrics' in info:
+        #'xxx' is the ID3 code of an unknown language.
+        data += _id3_frame(
+            'USLT', b'\x01' + b'xxx' + ''.encode('utf-16') + b'\x00\x00' +
+            info['lyrics'].encode('utf-16'), version)
+    data += b''.join(frames)
+    return b'ID3' + bytes((version, )) + b'\x00\x00' + \
+        _syncsafe(len(data)) + data
+
+
+def merge_id3(tag, info):
+    """Returns an ID3v2 tag for song info keeping the frames of
+       an existing tag (like cover art) not set from song info.
+
+       ID3v2.3 and v2.4 tags are merged, keeping their version.
+       Other versions and unsynchronised tags are replaced.
+
+       Args:
+            tag: Complete existing tag, header included.
+            info: Song info (tuple or dict from song_info).
+    """
+    version, flags = tag[3], tag[5]
+    if version not in (3, 4) or flags & 0x80:
+        return build_id3(info)
+
+    end = 10 + _unsyncsafe(tag[6:10])
+    pos = 10
+    if flags & 0x40:
+        #Extended header, v2.3 size does not count itself.
+        if version == 4:
+            pos += _unsyncsafe(tag[10:14])
+        else:
+            pos += 4 + struct.unpack('>I', tag[10:14])[0]
+
+    replaced = {frame_id for _, frame_id in
+                _id3_frame_ids(_song_dict(info), version)}
+    if _song_dict(info).get('lyrics'):
+        replaced.add('USLT')
+
+    frames = []
+    while pos + 10 <= end and tag[pos] != 0:
+        frame_id = tag[pos:pos + 4].decode('latin-1')
+        if version == 4:
+            size = _unsyncsafe(tag[pos + 4:pos + 8])
+        else:
+            size = struct.unpack('>I', tag[pos + 4:pos + 8])[0]
+        if frame_id not in replaced:
+            frames.append(tag[pos:pos + 10 + size])
+        pos += 10 + size
+    return build_id3(info, version, frames)
+
+
+def build_vorbis_comment(info, last=True):
+    """Returns a FLAC VORBIS_COMMENT metadata block for song info."""
+    info = _song_dict(info)
+    comments = [
+        ('{0}={1}'.format(name, info[key])).encode('utf-8')
+        for key, name in _VORBIS_NAMES if key in info
+    ]
+    body = struct.pack('<I', len(VENDOR)) + VENDOR + \
+        struct.pack('<I', len(comments)) + \
+        b''.join(struct.pack('<I', len(c)) + c for c in comments)
+    flags = (0x80 if last else 0) | _FLAC_VORBIS_COMMENT
+    return bytes((flags, )) + struct.pack('>I', len(body))[1:] + body
+
+
+class TaggingWriter:
+    """File like object writing audio with tags, while streaming.
+
+       The tag built from song info is written before the audio
+       and an existing tag of the same kind in the stream is
+       dropped on the way, so the file is written only once.
+
+       mp3:  ID3v2 tag written first. An ID3v2 tag at start of
+             the stream is buffered and merged, its frames not set
+             from song info (cover art, comments...) are kept, see
+             merge_id3.
+       flac: Metadata blocks are copied, VORBIS_COMMENT blocks are
+             skipped and our own is added as the last block.
+
+       Streams not looking like 'fmt' are written untouched.
+
+       Args:
+            fileobj: Binary file object to write into.
+            info: Song info (tuple or dict from song_info).
+            fmt: 'mp3' or 'flac'
+    """
+
+    def __init__(self, fileobj, info, fmt):
+        self.fileobj = fileobj
+        self.info = info
+        self.fmt = fmt
+        self._buf = b''
+        self._state = 'head'
+        #Bytes left to skip/copy and whether it was last flac block.
+        self._count = 0
+        self._last = False
+
+    def write(self, data):
+        if self._state == 'pass':
+            self.fileobj.write(data)
+            return
+        self._buf += data
+        while self._step():
+            pass
+
+    def _pass(self):
+        self._state = 'pass'
+        if self._buf:
+            self.fileobj.write(self._buf)
+            self._buf = b''
+
+    def _step(self):
+        """Process buffered data, returns False when more data
+           is needed."""
+        buf = self._buf
+        state = self._state
+
+        if state == 'pass':
+            self._pass()
+            return False
+
+        if state == 'id3':
+            #Whole existing tag is needed to merge it.
+            if len(buf) < self._count:
+                return False
+            self.fileobj.write(merge_id3(buf[:self._count], self.info))
+            self._buf = buf[self._count:]
+            self._pass()
+            return False
+
+        if state in ('skip', 'copy'):
+            n = min(self._count, len(buf))
+            if state == 'copy':
+                self.fileobj.write(buf[:n])
+            self._buf = buf[n:]
+            self._count -= n
+            if self._count:
+                return False
+            if self.fmt == 'flac' and not self._last:
+                self._state = 'block'
+            else:
+                if self.fmt == 'flac':
+                    self.fileobj.write(build_vorbis_comment(self.info))
+                self._pass()
+            return True
+
+        if self.fmt == 'mp3':
+            if len(buf) < 10:
+                return False
+            if buf[:3] == b'ID3':
+                #Tag size is a syncsafe int (7 bits per byte) not
+                #counting the header and the optional footer.
+                self._count = _unsyncsafe(buf[6:10]) + \
+                    (20 if buf[5] & 0x10 else 10)
+                self._state = 'id3'
+                return True
+            self.fileobj.write(build_id3(self.info))
+            self._pass()
+            return False
+
+        #flac
+        if state == 'head':
+            if len(buf) < 4:
+                return False
+            if buf[:4] != b'fLaC':
+                self._pass()
+                return False
+            self.fileobj.write(buf[:4])
+            self._buf = buf[4:]
+            self._state = 'block'
+            return True
+
+        #flac metadata block header
+        if len(buf) < 4:
+            return False
+        self._last = bool(buf[0] & 0x80)
+        block_type = buf[0] & 0x7f
+        self._count = int.from_bytes(buf[1:4], 'big')
+        self._buf = buf[4:]
+        if block_type == _FLAC_VORBIS_COMMENT:
+            self._state = 'skip'
+        else:
+            #Our comment block becomes the last one.
+            self.fileobj.write(bytes((block_type, )) + buf[1:4])
+            self._state = 'copy'
+        return True
+
+    def close(self):
+        """Write out data still buffered (for streams too short to
+           be recognized)."""
+        if self._state == 'head' and self.fmt == 'mp3':
+            self.fileobj.write(build_id3(self.info))
+        #A truncated existing tag is written as it is.
+        if self._state in ('head', 'pass', 'id3'):
+            self._pass()
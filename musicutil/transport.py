@@ -0,0 +1,381 @@
+#Imports
+import sys
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+
+TRANSPORTS = {}
+TRANSPORT_DEFAULT = 'requests'
+
+#Connection specific headers, not allowed in HTTP/2 requests.
+_HOP_BY_HOP = ('connection', 'keep-alive', 'proxy-connection',
+               'transfer-encoding', 'upgrade', 'host')
+
+
+class Response(object):
+    """Minimal response returned by every transport.
+
+       Only the parts used by the sources are kept, so all
+       backends can return the same thing.
+    """
+
+    def __init__(self, status_code, url, headers, content, encoding=None):
+        self.status_code = status_code
+        self.url = url
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class StreamResponse(object):
+    """Response whose body is read in chunks with 'iter_bytes'.
+
+       It must be closed (or used as context manager) to release
+       the connection.
+    """
+
+    def __init__(self, status_code, url, headers, chunks, close=None,
+                 encoding=None):
+        self.status_code = status_code
+        self.url = url
+        self.headers = headers
+        self.encoding = encoding or 'utf-8'
+        self._chunks = chunks
+        self._close = close
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def iter_bytes(self):
+        """Yield the (decoded content) body in chunks."""
+        return self._chunks
+
+    def close(self):
+        if self._close:
+            self._close()
+            self._close = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _charset(content_type):
+    """Return the charset from a Content-Type header or None."""
+    for param in (content_type or '').split(';')[1:]:
+        key, _, value = param.strip().partition('=')
+        if key.lower() == 'charset' and value:
+            return value.strip('"\'')
+    return None
+
+
+class BaseTransport(object):
+    """Base class for http transports used by the sources.
+
+       Args:
+            proxies: dict of scheme -> proxy url (like requests).
+            pool_maxsize: Connections kept open per host.
+    """
+
+    name = None
+
+    def __init__(self, proxies=None, pool_maxsize=10):
+        self.proxies = proxies
+        self.pool_maxsize = pool_maxsize
+
+    def request(self, method, url, headers=None, params=None, data=None,
+                timeout=None):
+        """Send the request and returns a 'Response'."""
+        raise NotImplementedError
+
+    def stream(self, method, url, headers=None, params=None, data=None,
+               timeout=None, chunk_size=16 * 1024):
+        """Send the request and returns a 'StreamResponse' without
+           reading the body.
+
+           Transports not able to stream read the whole body, and
+           return it as a single chunk.
+        """
+        r = self.request(method, url, headers, params, data, timeout)
+        return StreamResponse(r.status_code, r.url, r.headers,
+                              iter((r.content, )), encoding=r.encoding)
+
+    @property
+    def keeps_connections(self):
+        """True if connections are kept open between requests."""
+        return True
+
+    def close(self):
+        """Release all pooled connections."""
+        pass
+
+
+class RequestsTransport(BaseTransport):
+    """Transport using 'requests'.
+
+       Args:
+            session: A requests.Session to use, True to build a
+                     new one or None to use the requests api module
+                     (a new connection for every request).
+            close_connections: if True, the connections of session
+                               are closed after every request.
+    """
+
+    name = 'requests'
+
+    def __init__(self, session=None, proxies=None, pool_maxsize=10,
+                 close_connections=False):
+        super().__init__(proxies, pool_maxsize)
+        self.close_connections = close_connections
+
+        if isinstance(session, requests.Session):
+            self._session = session
+        elif session:  # Build a new session.
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_maxsize=pool_maxsize)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+        else:  # Use the Requests API module as a "session".
+            from requests import api
+            self._session = api
+
+    @property
+    def keeps_connections(self):
+        return (isinstance(self._session, requests.Session)
+                and not self.close_connections)
+
+    def request(self, method, url, headers=None, params=None, data=None,
+                timeout=None):
+        r = self._session.request(
+            method, url, headers=headers, params=params, data=data,
+            timeout=timeout, proxies=self.proxies)
+        try:
+            #Same charset fallback (utf-8) as the other transports,
+            #requests assumes ISO-8859-1 for text/* without charset.
+            return Response(r.status_code, r.url, r.headers, r.content,
+                            _charset(r.headers.get('Content-Type')))
+        finally:
+            if self.close_connections:
+                r.connection.close()
+
+    def stream(self, method, url, headers=None, params=None, data=None,
+               timeout=None, chunk_size=16 * 1024):
+        r = self._session.request(
+            method, url, headers=headers, params=params, data=data,
+            timeout=timeout, proxies=self.proxies, stream=True)
+
+        def close():
+            r.close()
+            if self.close_connections:
+                r.connection.close()
+
+        return StreamResponse(r.status_code, r.url, r.headers,
+                              r.iter_content(chunk_size), close,
+                              _charset(r.headers.get('Content-Type')))
+
+    def close(self):
+        if isinstance(self._session, requests.Session):
+            self._session.close()
+
+
+class Urllib3Transport(BaseTransport):
+    """Transport using a urllib3 pool manager directly, skipping
+       the per request overhead of requests."""
+
+    name = 'urllib3'
+
+    def __init__(self, proxies=None, pool_maxsize=10):
+        super().__init__(proxies, pool_maxsize)
+        import urllib3
+        self._urllib3 = urllib3
+        self._pool = urllib3.PoolManager(maxsize=pool_maxsize)
+        self._proxy_pools = {}
+
+    def _pool_for(self, url):
+        if not self.proxies:
+            return self._pool
+        proxy = self.proxies.get(url.split(':', 1)[0])
+        if not proxy:
+            return self._pool
+        if proxy not in self._proxy_pools:
+            self._proxy_pools[proxy] = self._urllib3.ProxyManager(
+                proxy, maxsize=self.pool_maxsize)
+        return self._proxy_pools[proxy]
+
+    def _send(self, method, url, headers, params, data, timeout,
+              preload_content=True):
+        if params:
+            params = {k: v for k, v in params.items() if v is not None}
+            #List values are repeated, like requests does.
+            url += ('&' if '?' in url else '?') + urlencode(params,
+                                                           doseq=True)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        r = self._pool_for(url).request(
+            method, url, headers=headers, body=data, timeout=timeout,
+            redirect=True, preload_content=preload_content)
+        return r, r.geturl() or url
+
+    def request(self, method, url, headers=None, params=None, data=None,
+                timeout=None):
+        r, url = self._send(method, url, headers, params, data, timeout)
+        return Response(r.status, url, r.headers, r.data,
+                        _charset(r.headers.get('Content-Type')))
+
+    def stream(self, method, url, headers=None, params=None, data=None,
+               timeout=None, chunk_size=16 * 1024):
+        r, url = self._send(method, url, headers, params, data, timeout,
+                            preload_content=False)
+        return StreamResponse(r.status, url, r.headers, r.stream(chunk_size),
+                              r.release_conn,
+                              _charset(r.headers.get('Content-Type')))
+
+    def close(self):
+        self._pool.clear()
+        for pool in self._proxy_pools.values():
+            pool.clear()
+
+
+class HTTP2Transport(BaseTransport):
+    """Transport using httpx with HTTP/2 enabled.
+
+       Concurrent requests to the same https host are multiplexed
+       over a single connection. HTTP/2 is only negotiated over
+       TLS, so plain http:// hosts (like the chiasenhac data hosts)
+       still get HTTP/1.1 with one connection per request in
+       flight. Needs the 'http2' extra (pip install musicutil[http2]).
+    """
+
+    name = 'http2'
+
+    def __init__(self, proxies=None, pool_maxsize=10):
+        super().__init__(proxies, pool_maxsize)
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("'http2' transport needs httpx, install it "
+                              "with 'pip install musicutil[http2]' (or "
+                              "'pip install httpx[http2]').")
+
+        mounts = None
+        if proxies:
+            mounts = {
+                scheme + '://': httpx.HTTPTransport(proxy=proxy, http2=True)
+                for scheme, proxy in proxies.items()
+            }
+        self._client = httpx.Client(
+            http2=True,
+            follow_redirects=True,
+            mounts=mounts,
+            limits=httpx.Limits(max_connections=pool_maxsize))
+
+    def _build(self, method, url, headers, params, data, timeout):
+        if params:
+            params = {k: v for k, v in params.items() if v is not None}
+        if headers:
+            headers = {k: v for k, v in headers.items()
+                       if k.lower() not in _HOP_BY_HOP}
+        return self._client.build_request(
+            method, url, headers=headers, params=params, content=data,
+            timeout=timeout)
+
+    def request(self, method, url, headers=None, params=None, data=None,
+                timeout=None):
+        r = self._client.send(
+            self._build(method, url, headers, params, data, timeout))
+        return Response(r.status_code, str(r.url), r.headers, r.content,
+                        _charset(r.headers.get('Content-Type')))
+
+    def stream(self, method, url, headers=None, params=None, data=None,
+               timeout=None, chunk_size=16 * 1024):
+        r = self._client.send(
+            self._build(method, url, headers, params, data, timeout),
+            stream=True)
+        return StreamResponse(r.status_code, str(r.url), r.headers,
+                              r.iter_bytes(chunk_size), r.close,
+                              _charset(r.headers.get('Content-Type')))
+
+    def close(self):
+        self._client.close()
+
+
+#Register transports
+for transport_class in (RequestsTransport, Urllib3Transport, HTTP2Transport):
+    TRANSPORTS.update({transport_class.name: transport_class})
+
+
+def get_transport(name=None):
+    if not name or name == 'default':
+        name = TRANSPORT_DEFAULT
+    try:
+        return TRANSPORTS[name]
+    except KeyError:
+        raise KeyError("No transport named {} found.".format(name))
+
+
+def benchmark(url, names=None, total=200, workers=16):
+    """Compare the transports by fetching 'url' concurrently.
+
+       Meant to be run against a local server, so that only the
+       client side overhead is measured.
+
+       Args:
+            url: Url to fetch.
+            names: Transport names to compare [Default: all]
+            total: Number of requests per transport.
+            workers: Number of concurrent threads.
+
+       Returns:
+            A dict of transport name -> (requests/sec, mean latency)
+            Transports which can not be built (missing optional
+            dependency) are skipped.
+    """
+    results = {}
+    for name in names or TRANSPORTS:
+        try:
+            transport_class = get_transport(name)
+            if issubclass(transport_class, RequestsTransport):
+                transport = transport_class(True, pool_maxsize=workers)
+            else:
+                transport = transport_class(pool_maxsize=workers)
+        except ImportError:
+            continue
+
+        def fetch(_):
+            start = time.perf_counter()
+            transport.request('GET', url)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(fetch, range(total)))
+        elapsed = time.perf_counter() - start
+        transport.close()
+
+        results[name] = (total / elapsed, sum(latencies) / total)
+    return results
+
+
+if __name__ == '__main__':
+    for name, (rps, latency) in benchmark(sys.argv[1]).items():
+        print('{0:10} {1:10.1f} req/s {2:8.2f} ms'.format(
+            name, rps, latency * 1000))
@@ -6,10 +6,22 @@ import os
 import ntpath
 import datetime
 import json
+import time
+import threading
 from subprocess import check_call, DEVNULL, STDOUT
+from urllib.parse import urlparse
 
 from spotipy import oauth2, SpotifyException
 
+try:
+    from .bandwidth import get_manager, BULK
+    from .tagging import TaggingWriter, tag_format
+    from .health import check_host
+except (ModuleNotFoundError, ImportError):
+    from bandwidth import get_manager, BULK
+    from tagging import TaggingWriter, tag_format
+    from health import check_host
+
 
    
 def remote_file_size(url, unit='B'):
@@ -56,12 +68,78 @@ def remote_file_size(url, unit='B'):
     return size
 
 
+def download_file(url, path, session=None, chunk_size=64 * 1024,
+                  timeout=None, priority=BULK, job=None, bandwidth=None,
+                  mirrors=None, song_info=None):
+    """Download url into path, streaming it through the
+       bandwidth manager.
+
+       Args:
+            url: File url
+            path: Where to save the file
+            session: (Optional) requests.Session to use
+            chunk_size: Bytes read from the response at once
+            timeout: Http timeout in seconds
+            priority: bandwidth.INTERACTIVE or bandwidth.BULK
+            job: Key of the per job bandwidth limit [Default: path]
+            bandwidth: A BandwidthManager [Default: process wide one]
+            mirrors: (Optional) mirrors.MirrorSelector to record
+                     the measured speed of the host in.
+            song_info: (Optional) Song info (as returned by
+                       song_info) to tag the file with while it
+                       is written. Only mp3 and flac are tagged.
+                       Tags already in the file are merged, fields
+                       of song info replace theirs and other
+                       frames (cover art...) are kept. The flac
+                       comment block is replaced as a whole.
+
+       Returns:
+            Number of bytes received.
+    """
+    bandwidth = bandwidth or get_manager()
+    host = urlparse(url).netloc.lower()
+
+    start = time.perf_counter()
+    try:
+        r = (session or requests).get(url, stream=True, timeout=timeout)
+        r.raise_for_status()
+    except requests.RequestException:
+        if mirrors:
+            mirrors.record_failure(url)
+        raise
+    latency = time.perf_counter() - start
+
+    fmt = tag_format(path) or tag_format(url)
+    received = 0
+    try:
+        with open(path, 'wb') as fw:
+            #Tags are written in the same pass as the audio.
+            out = TaggingWriter(fw, song_info, fmt) \
+                if song_info and fmt else fw
+            for chunk in bandwidth.stream(r.iter_content(chunk_size), host,
+                                          job or path, priority):
+                out.write(chunk)
+                received += len(chunk)
+            if out is not fw:
+                out.close()
+    finally:
+        r.close()
+
+    if mirrors:
+        mirrors.record_transfer(url, received,
+                                time.perf_counter() - start, latency)
+    return received
+
+
 def get_inner_texts(tag):
     """Retrives the text inside a tag
 
        Fetch the string/NavigableString inside the 
        provided tag.
 
+       NOTE:- Not used by the sources anymore (see extract.Field
+              with get='texts'), kept for API compatibility.
+
        Args:
             tag: An beautifulsoup4 tag to look inside.
 
@@ -149,19 +227,16 @@ def convert_size(size,  unit='mb', dec=2):
     return size
 
 
-def is_online():
+def is_online(timeout=2):
     """Returns True if devices can communicate on internet.
+
+       Makes a single connect attempt of at most 'timeout' seconds
+       and caches the result for a short time. To check a music
+       source without blocking use health.is_source_available.
     """
-    for time_out in (2,5,10,15):
-        try:
-            # connect to the host -- tells us if the host is actually
-            # reachable
-            s = requests.adapters.socket.create_connection(("www.google.com", 80), time_out)
-            s.close()
-            return True
-        except OSError:
-            pass
-    return False
+    # connect to the host -- tells us if the host is actually
+    # reachable
+    return check_host("www.google.com", 80, timeout)
 
 
 def prompt_for_spotify_token(username, scope, client_id = None,
@@ -266,39 +341,50 @@ def get_quality(all_qualities, pref=0, *args):
                   0 => Best
                   1 => Middle
                   2 => Lowest
-    """
-    #Remove duplicate entries
-    args = list(dict.fromkeys(args))
-
-    #make local copy of Qualities
-    q_list = tuple(q for q in all_qualities)
-    sorted_q = []
 
-    for q in q_list:
-        for given_q in args:
-            if q == given_q:
-                sorted_q.append(q)
+       See mirrors.MirrorSelector for picking a download option
+       using both quality and speed of the download hosts.
+    """
+    #Keep given qualities in order of all_qualities, once each.
+    given = set(args)
+    sorted_q = [q for q in all_qualities if q in given]
 
     lth = len(sorted_q)
     if pref == 0:
         return sorted_q[0]
-        
+
     elif pref == 1:
-        lth = len(sorted_q)
-        if is_even(lth):
-            return sorted_q[lth//2]
-        else:
-            return sorted_q[(lth+1)//2]
+        return sorted_q[lth//2]
 
     elif pref == 2:
         return sorted_q[lth-1]
 
 
+def create_file(path):
+    """Create an empty file (and its directories) if it
+       does not exist already.
+
+       Args:
+            path: Full path of the file.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if not os.path.exists(path):
+        open(path, 'a').close()
+
+
 class Cache:
-    """Very Simple Class for implementing caching."""
+    """Very Simple Class for implementing caching.
+
+       Reads and writes of cache files are serialized with a
+       process wide lock, so cached functions can be called
+       from many threads at once.
+    """
 
     CACHE_DIR = os.path.join(ntpath.dirname(__file__), '.cache/')
     CACHE_EXT = '.cache'
+    _LOCK = threading.RLock()
 
     @staticmethod
     def is_cache_expired(time_cache):
@@ -350,22 +436,27 @@ class Cache:
            """
         def decorater(func):
 
-            cache_path = path
-            if not cache_path:
-                cache_path = cls.CACHE_DIR + func.__name__ + cls.CACHE_EXT
-            
-
             def wrapper(*args, **kwargs):
-                
-                create_file(cache_path)
-
-                cache_data = cls._read_cache(cache_path)
-                if cache_data:
-                    if not cls.is_cache_expired(cache_data['expire']):
-                        return cache_data['content']
-                    
+                #Resolved per call, so CACHE_DIR can be changed later.
+                cache_path = path
+                if not cache_path:
+                    cache_path = os.path.join(cls.CACHE_DIR,
+                                              func.__name__ + cls.CACHE_EXT)
+
+                with cls._LOCK:
+                    create_file(cache_path)
+
+                    cache_data = cls._read_cache(cache_path)
+                    if cache_data:
+                        if not cls.is_cache_expired(cache_data['expire']):
+                            return cache_data['content']
+
+                #func may do network I/O, do not block other cached
+                #calls while it runs. Concurrent misses may both call
+                #func, the last one to finish is cached.
                 data = func(*args, **kwargs)
-                cls._write_cache(cache_path, data, expire)
+                with cls._LOCK:
+                    cls._write_cache(cache_path, data, expire)
                 return data
 
             return wrapper
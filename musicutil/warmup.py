@@ -0,0 +1,129 @@
+#Imports
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+_getaddrinfo = socket.getaddrinfo
+
+
+class DNSCache:
+    """Cache of getaddrinfo results with a TTL.
+
+       'install' makes it process wide by replacing
+       socket.getaddrinfo, so every http client (requests,
+       urllib3, httpx) uses it. Failed lookups are not cached.
+
+       Args:
+            ttl: Seconds a resolved address is kept.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached and now - cached[1] < self.ttl:
+            return cached[0]
+        result = _getaddrinfo(host, port, family, type, proto, flags)
+        with self._lock:
+            self._cache[key] = (result, time.monotonic())
+        return result
+
+    def resolve(self, host, port=80):
+        """Resolve host (for tcp) and cache it."""
+        return self.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def install(self):
+        socket.getaddrinfo = self.getaddrinfo
+        return self
+
+    @staticmethod
+    def uninstall():
+        socket.getaddrinfo = _getaddrinfo
+
+
+def base_url(url):
+    """Returns 'scheme://host[:port]/' of url."""
+    url = urlparse(url)
+    return '{0}://{1}/'.format(url.scheme, url.netloc)
+
+
+class Warmer:
+    """Resolve hosts and open pooled connections ahead of the
+       first real request.
+
+       Sources given a warmer (the 'warmer' argument) warm their
+       own host when created and the data hosts returned by
+       download_details. Connections are only kept by pooling
+       transports, e.g. a source created with thread_safe=True and
+       requests_session=True. With other transports only the host
+       name is resolved.
+
+       Args:
+            dns: (Optional) DNSCache to resolve hosts with, it
+                 should be installed to be used by the transports.
+            workers: Hosts warmed concurrently in background.
+            timeout: Timeout of the warm up request.
+            ttl: Seconds before an already warmed host is warmed
+                 again.
+    """
+
+    def __init__(self, dns=None, workers=4, timeout=5, ttl=60):
+        self.dns = dns
+        self.timeout = timeout
+        self.ttl = ttl
+        self._warmed = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _warm_host(self, base, transport):
+        url = urlparse(base)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        try:
+            if self.dns:
+                self.dns.resolve(url.hostname, port)
+            else:
+                socket.getaddrinfo(url.hostname, port, 0, socket.SOCK_STREAM)
+            if transport and transport.keeps_connections:
+                #Any response will do, the connection stays pooled.
+                transport.request('HEAD', base, timeout=self.timeout)
+        except Exception:
+            #Warm up is best effort, forget host so it is retried.
+            with self._lock:
+                self._warmed.pop(base, None)
+
+    def warm(self, urls, transport=None):
+        """Warm hosts of urls not warmed recently, in background.
+
+           Args:
+                urls: Iterable of urls.
+                transport: Transport whose pool to fill.
+
+           Returns:
+                List of futures, one per host being warmed.
+        """
+        futures = []
+        now = time.monotonic()
+        with self._lock:
+            for base in {base_url(url) for url in urls if url}:
+                warmed = self._warmed.get(base)
+                if warmed is not None and now - warmed < self.ttl:
+                    continue
+                self._warmed[base] = now
+                futures.append(
+                    self._executor.submit(self._warm_host, base, transport))
+        return futures
+
+    def close(self):
+        self._executor.shutdown(wait=False)
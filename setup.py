@@ -17,6 +17,11 @@ REQUIRED = [
     'beautifulsoup4','requests', 'html5lib', 'spotipy'
 ]
 
+# Optional dependencies, installed with musicutil[extra].
+EXTRAS = {
+    'http2': ['httpx[http2]'],
+}
+
 here = os.path.abspath(os.path.dirname(__file__))
 
 # Import the README and use it as the long-description.
@@ -39,6 +44,10 @@ setup(
     packages=find_packages(exclude=('tests',)),
    
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
+    entry_points={
+        'console_scripts': ['musicutil=musicutil.cli:main'],
+    },
     include_package_data=True,
     license='MIT',
     classifiers=[
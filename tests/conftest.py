@@ -0,0 +1,188 @@
+#Imports
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+
+def hits_page(hits):
+    """Search result page like the ones of chiasenhac.vn, of
+       (song, artist, relative url) hits."""
+    items = ''.join(
+        '<li><h5><a href="{2}">{0}</a></h5>'
+        '<div class="author">{1}</div></li>'.format(*hit) for hit in hits)
+    return ('<html><body><form name="song_list" action="/tim-kiem?s=">'
+            '</form><div id="nav-music"><ul>{0}</ul></div>'
+            '</body></html>').format(items)
+
+
+def search_page(query, page, count=10):
+    """Search result page of 'count' songs named after query."""
+    return hits_page(('{0} {1}-{2}'.format(query, page, i),
+                      'Artist {0}'.format(query),
+                      'song/{0}-{1}-{2}.html'.format(query, page, i))
+                     for i in range(count))
+
+
+def song_page(song):
+    """Song page with song info and a 320kbps and a 128kbps
+       download option."""
+    items = ''.join(
+        '<a class="download_item" href="http://data{0}.local/{1}.mp3">'
+        '<span>Download</span><span>{1}</span><span>{2}</span>'
+        '<span>{3}</span></a>'.format(i, song, quality, size)
+        for i, (quality, size) in enumerate((('320kbps', '9.6 MB'),
+                                             ('128kbps', '3.8 MB'))))
+    return ('<html><body><div id="pills-plus"><h4><span>{0}</span></h4>'
+            '<ul><li>Artist: <a>Artist {0}</a></li>'
+            '<li>Album: <a>Album {0}</a></li><li>2019</li></ul></div>'
+            '{1}<div id="fulllyric">la<br/>la</div>'
+            '</body></html>').format(song, items)
+
+
+class Redirect:
+    """Route result redirecting to 'location'."""
+
+    def __init__(self, location):
+        self.location = location
+
+
+class PageServer:
+    """Local http server standing in for a music source.
+
+       'routes' maps a path (or a prefix ending with '*') to a
+       callable(path, query dict) returning the body (str or
+       bytes), a (body, content type) tuple, a Redirect or None for
+       404. Requests are counted per path in 'hits' and the
+       headers of the last one are kept in 'headers'.
+    """
+
+    def __init__(self, routes=None, delay=0):
+        self.routes = dict(routes or {})
+        self.delay = delay
+        self.hits = {}
+        self.headers = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.do_GET(body=False)
+
+            def do_GET(self, body=True):
+                url = urlparse(self.path)
+                with server._lock:
+                    server.hits[url.path] = server.hits.get(url.path, 0) + 1
+                    server.headers[url.path] = dict(self.headers)
+                route = server.routes.get(url.path)
+                if route is None:
+                    for prefix, func in server.routes.items():
+                        if prefix.endswith('*') and \
+                                url.path.startswith(prefix[:-1]):
+                            route = func
+                            break
+                data = route(url.path, parse_qs(url.query)) if route else None
+                if server.delay:
+                    time.sleep(server.delay)
+                if data is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if isinstance(data, Redirect):
+                    self.send_response(302)
+                    self.send_header('Location', data.location)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                content_type = 'text/html; charset=utf-8'
+                if isinstance(data, tuple):
+                    data, content_type = data
+                if isinstance(data, str):
+                    data = data.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                if body:
+                    try:
+                        self.wfile.write(data)
+                    except OSError:
+                        pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_port
+        self.url = 'http://127.0.0.1:{0}/'.format(self.port)
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def source_routes():
+    """Routes serving search and song pages."""
+    def search(path, query):
+        return search_page(query['q'][0], query.get('page_music', ['1'])[0])
+
+    def song(path, query):
+        return song_page(path.rsplit('/', 1)[1][:-len('.html')])
+
+    return {
+        '/tim-kiem': search,
+        '/song/*': song,
+    }
+
+
+@pytest.fixture
+def page_server():
+    servers = []
+
+    def start(routes=None, delay=0):
+        server = PageServer(routes, delay)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def make_source():
+    """Returns a factory of chiasenhac_vn sources scraping
+       'server' instead of the real site.
+
+       The search url is the one of 'server' unless
+       search_url=False, then it is read from the homepage like
+       on the real site (see homepage_route)."""
+    from musicutil.MusicSource import chiasenhac_vn
+
+    def make(server, search_url=True, **kwargs):
+        source = chiasenhac_vn(**kwargs)
+        #Relative urls of the pages resolve against the server.
+        source.prefix = server.url
+        if search_url:
+            url = server.url + 'tim-kiem'
+            source._update_search_url = lambda html=None: url
+        return source
+
+    return make
+
+
+def homepage_route(server):
+    """Route of the homepage having the search form of 'server'."""
+    def homepage(path, query):
+        return ('<html><body><form name="song_list" action="{0}tim-kiem?s=">'
+                '</form></body></html>').format(server.url)
+    return homepage
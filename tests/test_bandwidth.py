@@ -0,0 +1,89 @@
+#Imports
+import threading
+import time
+
+from musicutil.bandwidth import (TokenBucket, BandwidthManager, INTERACTIVE,
+                                 BULK)
+from musicutil.util import download_file
+
+KB = 1024
+
+
+def file_server(page_server, sizes):
+    return page_server(
+        {'/{0}.bin'.format(name): (lambda path, query, n=n: b'x' * n)
+         for name, n in sizes.items()})
+
+
+def timed_download(url, path, results, **kwargs):
+    start = time.monotonic()
+    size = download_file(url, str(path), chunk_size=16 * KB, **kwargs)
+    results[url] = (size, time.monotonic() - start, time.monotonic())
+
+
+def test_total_rate_limit(page_server, tmp_path):
+    server = file_server(page_server, {'file': 512 * KB})
+    manager = BandwidthManager(total=256 * KB)
+    results = {}
+    url = server.url + 'file.bin'
+
+    timed_download(url, tmp_path / 'file.bin', results, bandwidth=manager)
+
+    size, seconds, _ = results[url]
+    assert size == 512 * KB
+    #One second worth is the burst, the rest is paced.
+    assert 0.8 < seconds < 3
+
+
+def test_interactive_preempts_bulk(page_server, tmp_path):
+    server = file_server(page_server, {'bulk': 1024 * KB, 'song': 256 * KB})
+    manager = BandwidthManager(total=512 * KB)
+    #Start with an empty bucket, so both transfers are paced.
+    manager.acquire(512 * KB)
+    results = {}
+    bulk = threading.Thread(
+        target=timed_download,
+        args=(server.url + 'bulk.bin', tmp_path / 'bulk.bin', results),
+        kwargs={'bandwidth': manager, 'priority': BULK})
+    bulk.start()
+    time.sleep(0.2)
+    timed_download(server.url + 'song.bin', tmp_path / 'song.bin', results,
+                   bandwidth=manager, priority=INTERACTIVE)
+    bulk.join()
+
+    song = results[server.url + 'song.bin']
+    bulk = results[server.url + 'bulk.bin']
+    assert song[0] == 256 * KB and bulk[0] == 1024 * KB
+    #Alone on the link the song takes 0.5s, sharing it ~1s.
+    assert song[1] < 0.8
+    assert song[2] < bulk[2]
+
+
+def test_limits_change_at_runtime(page_server, tmp_path):
+    server = file_server(page_server, {'file': 1024 * KB})
+    manager = BandwidthManager(per_host=32 * KB)
+    results = {}
+    url = server.url + 'file.bin'
+    thread = threading.Thread(target=timed_download,
+                              args=(url, tmp_path / 'file.bin', results),
+                              kwargs={'bandwidth': manager})
+    thread.start()
+    time.sleep(0.3)
+    assert not results
+    #Would take ~30s at the first limit.
+    manager.set_limits(per_host=None)
+    thread.join(5)
+    assert results[url][0] == 1024 * KB
+
+
+def test_rate_change_does_not_refill_bucket():
+    bucket = TokenBucket(100 * KB)
+    bucket.take(100 * KB)
+    bucket.set_rate(200 * KB)
+    assert bucket.tokens < 1 * KB
+    assert bucket.delay(100 * KB, time.monotonic()) > 0.4
+
+    bucket.set_rate(None)
+    assert bucket.delay(100 * KB, time.monotonic()) == 0
+    bucket.set_rate(50 * KB)
+    assert bucket.delay(50 * KB, time.monotonic()) > 0.9
@@ -0,0 +1,71 @@
+#Imports
+import json
+
+import pytest
+
+from musicutil import cli
+
+from conftest import source_routes
+
+
+def test_resolve_returns_max_hits(page_server, make_source):
+    server = page_server(source_routes())
+    source = make_source(server)
+
+    for max in (1, 3, 10, 12):
+        songs = cli.resolve(source, 'hello', max)
+        assert len(songs) == max
+        assert all(song['downloads'] for song in songs)
+
+    #One download page per resolved hit, none for extra ones.
+    assert server.hits['/tim-kiem'] == 5
+    assert sum(n for path, n in server.hits.items()
+               if path.startswith('/song/')) == 1 + 3 + 10 + 12
+
+
+def read_records(path):
+    with open(path, encoding='utf-8') as fr:
+        return [json.loads(line) for line in fr]
+
+
+def test_main_writes_ndjson_and_resumes(page_server, tmp_path, capsys):
+    server = page_server(source_routes())
+    urls = ['{0}song/s{1}.html'.format(server.url, i) for i in range(6)]
+    missing = server.url + 'late/s6.html'
+    inputs = tmp_path / 'inputs.txt'
+    inputs.write_text('\n'.join(urls + [missing, '']) + '\n')
+    output = tmp_path / 'out.ndjson'
+    args = [str(inputs), '-o', str(output), '-j', '3', '-i']
+
+    assert cli.main(args) == 1
+    records = read_records(output)
+    assert sorted(r['input'] for r in records) == sorted(urls + [missing])
+    errors = [r for r in records if 'error' in r]
+    assert [r['input'] for r in errors] == [missing]
+    song = next(r for r in records if r['input'] == urls[0])['results'][0]
+    assert len(song['downloads']) == 2 and song['info']['name'] == 's0'
+    assert 'processed: 7, errors: 1' in capsys.readouterr().err
+
+    #Interrupted run, the last line is only half written.
+    data = output.read_bytes()
+    cut = data.rstrip(b'\n').rfind(b'\n') + 1
+    partial = json.loads(data[cut:])['input']
+    output.write_bytes(data[:cut + 10])
+
+    #The missing song is now there, it is retried with the partial one.
+    server.routes['/late/*'] = server.routes['/song/*']
+    hits = dict(server.hits)
+    assert cli.main(args + ['-r']) == 0
+
+    records = read_records(output)
+    good = [r['input'] for r in records if 'error' not in r]
+    assert sorted(good) == sorted(urls + [missing])
+    retried = {partial, missing}
+    assert sum(server.hits.values()) - sum(hits.values()) == \
+        2 * len(retried)
+
+
+def test_unknown_transport_is_rejected(capsys):
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(['--transport', 'carrier-pigeon'])
+    assert 'invalid choice' in capsys.readouterr().err
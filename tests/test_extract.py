@@ -0,0 +1,150 @@
+#Imports
+from musicutil.extract import Extractor, Field, Group
+
+PAGE = '''
+<html><body>
+  <h1>Title</h1><h1>Second title</h1>
+  <p class="intro lead" id="p1">Intro <b>bold</b> end</p>
+  <a href="/outside">Outside</a>
+  <ul id="list">
+    <li class="song"><a href="/a">A</a><span>x</span><span>y</span></li>
+    <li class="song other"><a href="/b">B</a></li>
+    <li class="ad"><a href="/ad">Ad</a></li>
+    <li class="song"><span>no link</span></li>
+  </ul>
+</body></html>
+'''
+
+
+def test_field_values():
+    data = Extractor(
+        Field('title', 'h1'),
+        Field('titles', 'h1', multiple=True),
+        Field('id', 'p', {'class': 'lead'}, get='@id'),
+        Field('texts', 'p', get='texts'),
+        #Several children, no single string.
+        Field('string', 'p'),
+        Field('name', 'p', get=lambda tag: tag.name.upper()),
+        Field('missing', 'table'),
+    ).extract(PAGE)
+
+    #Non multiple fields keep the first match.
+    assert data['title'] == 'Title'
+    assert data['titles'] == ['Title', 'Second title']
+    assert data['id'] == 'p1'
+    assert data['texts'] == ['Intro ', 'bold', ' end']
+    assert all(type(text) is str for text in data['texts'])
+    assert data['string'] is None
+    assert data['name'] == 'P'
+    #No key for fields which did not match.
+    assert 'missing' not in data
+
+
+def test_attribute_matching():
+    rules = Extractor(
+        Field('lead', 'p', {'class': 'lead'}, get='@id'),
+        Field('wrong_class', 'p', {'class': 'lea'}, get='@id'),
+        Field('by_id', 'p', {'id': 'p1'}, get='@id'),
+        Field('wrong_id', 'p', {'id': 'p'}, get='@id'),
+    )
+    assert rules.extract(PAGE) == {'lead': 'p1', 'by_id': 'p1'}
+
+
+def test_groups_and_scopes():
+    data = Extractor(
+        Field(None, 'ul', {'id': 'list'}, get=None, fields=[
+            Group('songs', 'li', {'class': 'song'}, fields=[
+                #Fields of a scope are also matched on its own tag.
+                Field('classes', 'li', get='@class'),
+                Field('url', 'a', get='@href'),
+                Field('spans', 'span', multiple=True),
+            ]),
+        ]),
+        #Same tag as a field inside a scope, matched independently.
+        Field('first_link', 'a', get='@href'),
+    ).extract(PAGE)
+
+    assert data['first_link'] == '/outside'
+    assert data['songs'] == [
+        {'classes': ['song'], 'url': '/a', 'spans': ['x', 'y']},
+        {'classes': ['song', 'other'], 'url': '/b'},
+        {'classes': ['song'], 'spans': ['no link']},
+    ]
+
+
+def test_nested_fields_share_record():
+    data = Extractor(
+        Group('items', 'li', fields=[
+            Field('name', 'a', fields=[Field('url', 'a', get='@href')]),
+        ]),
+        #Scoped fields outside of the scope tag are not matched.
+        Field(None, 'h1', get=None, fields=[Field('inner', 'a')]),
+    ).extract(PAGE)
+
+    assert data['items'][:3] == [
+        {'name': 'A', 'url': '/a'},
+        {'name': 'B', 'url': '/b'},
+        {'name': 'Ad', 'url': '/ad'},
+    ]
+    assert data['items'][3] == {}
+    assert 'inner' not in data
+
+
+SONG_RULES = Extractor(
+    Field(None, 'div', {'id': 'nav-music'}, get=None, fields=[
+        Group('songs', 'li', fields=[
+            Field('name', 'h5', fields=[Field('url', 'a', get='@href')]),
+            Field('artist', 'div', {'class': 'author'}),
+            Field('lines', 'div', {'class': 'author'}, get='texts'),
+            Field('tags', 'span', multiple=True),
+            Field('kind', 'li', get=lambda tag: tag.get('data-kind')),
+        ]),
+    ]))
+
+STREAM_PAGE = '''<!DOCTYPE html>
+<html><head><title>Search</title><meta charset="utf-8"></head><body>
+<div id="nav-music"><ul>
+  <li data-kind="song"><h5><a href="/a?x=1&amp;y=2">Rock &amp; Roll
+      &eacute;&#233;</a></h5><div class="author">Artist A</div></li>
+  <li><!-- ad slot --></li>
+  <li><h5>Only <b>partly</b> linked</h5>
+      <div class="author">Line one<br>Line two<br/>Line three</div>
+  <li><h5><a href="/c">Unclosed C</a></h5>
+      <span>new</span><span>hot</span><img src="x.png">
+  <li><h5><a href="/d">Comment<!-- c --></a></h5>
+      <div class="author"><!-- only a comment --></div></li>
+</ul></div>
+<p>First<p>Second
+<ul><li><h5><a href="/outside">Outside</a></h5></li></ul>
+</body></html>'''
+
+
+def chunks(text, size):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+def test_stream_matches_extract():
+    expected = SONG_RULES.extract(STREAM_PAGE)['songs']
+    assert len(expected) == 5
+    assert expected[0]['name'] == 'Rock & Roll\n      \xe9\xe9'
+    assert expected[0]['url'] == '/a?x=1&y=2'
+    assert expected[2]['lines'] == ['Line one', 'Line two', 'Line three']
+
+    for size in (1, 3, 7, 64, len(STREAM_PAGE)):
+        records = list(SONG_RULES.stream(chunks(STREAM_PAGE, size)))
+        assert [name for name, _ in records] == ['songs'] * 5
+        assert [record for _, record in records] == expected
+
+
+def test_stream_yields_before_the_end():
+    fed = []
+
+    def feed():
+        for chunk in chunks(STREAM_PAGE, 16):
+            fed.append(chunk)
+            yield chunk
+
+    records = SONG_RULES.stream(feed())
+    next(records)
+    #The first song is yielded once its li is closed.
+    assert len(''.join(fed)) < STREAM_PAGE.index('<!-- ad slot -->') + 16
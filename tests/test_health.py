@@ -0,0 +1,96 @@
+#Imports
+import socket
+import time
+
+import pytest
+
+from musicutil import health
+from musicutil.health import HealthMonitor
+
+
+def free_port():
+    """A local port nobody listens on."""
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def wait_for(check, timeout=5):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if check():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def listener():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    s.listen(16)
+    yield s.getsockname()[1]
+    s.close()
+
+
+def test_up_and_down(listener):
+    monitor = HealthMonitor({'up': ('127.0.0.1', listener),
+                             'down': ('127.0.0.1', free_port())},
+                            timeout=1)
+    assert monitor.probe('up').up
+    assert monitor.probe('up').latency is not None
+    assert not monitor.probe('down').up
+    assert monitor.is_available('up') is True
+    assert monitor.is_available('down') is False
+
+
+def test_first_call_does_not_block(listener, monkeypatch):
+    real_probe = health.probe_host
+
+    def slow_probe(host, port, timeout=3):
+        time.sleep(0.5)
+        return real_probe(host, port, timeout)
+
+    monkeypatch.setattr(health, 'probe_host', slow_probe)
+    monitor = HealthMonitor({'x': ('127.0.0.1', listener)})
+
+    start = time.monotonic()
+    assert monitor.is_available('x', default='unknown') == 'unknown'
+    assert time.monotonic() - start < 0.2
+    assert wait_for(lambda: monitor.state('x') is not None)
+    assert monitor.is_available('x') is True
+
+
+def test_ttl_expiry(listener):
+    monitor = HealthMonitor({'x': ('127.0.0.1', listener)}, ttl=0.2)
+    first = monitor.probe('x')
+    #Fresh state is served from cache.
+    assert monitor.is_available('x') and monitor.state('x') is first
+
+    time.sleep(0.3)
+    #Stale state is still returned, a new probe runs in background.
+    assert monitor.is_available('x') is True
+    assert wait_for(lambda: monitor.state('x') is not first)
+
+
+def test_background_thread_survives_errors(listener, monkeypatch):
+    calls = []
+    real_probe = health.probe_host
+
+    def flaky_probe(host, port, timeout=3):
+        calls.append(port)
+        if len(calls) == 1:
+            raise ValueError('unexpected')
+        return real_probe(host, port, timeout)
+
+    monkeypatch.setattr(health, 'probe_host', flaky_probe)
+    monitor = HealthMonitor({'x': ('127.0.0.1', listener)}, interval=0.05)
+    monitor.start()
+    try:
+        assert wait_for(lambda: monitor.state('x') is not None)
+        assert monitor._thread.is_alive()
+        assert monitor.state('x').up
+    finally:
+        monitor.stop()
@@ -0,0 +1,67 @@
+#Imports
+from musicutil.MusicSource import chiasenhac_vn
+from musicutil.mirrors import MirrorSelector
+
+Q = chiasenhac_vn.Quality
+MB = 1024**2
+
+
+def details(hosts):
+    """download_details like options, 'hosts' gives the host of
+       every quality from best to worst."""
+    sizes = ('30 MB', '15 MB', '9.6 MB', '3.8 MB', '1 MB')
+    return [(quality, 'http://{0}/song.{1}'.format(host, quality.name), size)
+            for quality, host, size in zip(Q, hosts, sizes)]
+
+
+def test_equal_hosts_pick_best_quality():
+    options = details(['data25.local'] * 5)
+    assert MirrorSelector().select(options)[0] is Q.flac
+
+    #Quality still wins when the single host is measured, slow or fast.
+    for speed in (32 * 1024, 10 * MB):
+        selector = MirrorSelector()
+        selector.record_transfer(options[0][1], speed, 1)
+        assert selector.select(options)[0] is Q.flac
+
+
+def test_congested_host_is_avoided():
+    options = details(['data1.local', 'data1.local', 'data2.local',
+                       'data2.local', 'data2.local'])
+    selector = MirrorSelector()
+    selector.record_transfer('http://data1.local/x', 50 * 1024, 1)
+    selector.record_transfer('http://data2.local/x', 2 * MB, 1)
+    assert selector.select(options)[0] is Q.mp3_320kbps
+
+    #Slightly slower hosts are not penalized.
+    selector.record_transfer('http://data1.local/x', 2 * MB, 1)
+    selector.record_transfer('http://data1.local/x', 2 * MB, 1)
+    selector.record_transfer('http://data1.local/x', 2 * MB, 1)
+    assert selector.select(options)[0] is Q.flac
+
+
+def test_target_time_and_max_size():
+    options = details(['data25.local'] * 5)
+    selector = MirrorSelector(target_time=10)
+    selector.record_transfer(options[0][1], 1 * MB, 1)
+    #flac takes ~30s (2 steps over target), m4a ~15s (0.5 step).
+    assert selector.select(options)[0] is Q.m4a_500kbps
+
+    assert MirrorSelector().select(options,
+                                   max_size='10 MB')[0] is Q.mp3_320kbps
+
+
+def test_empty_transfers_do_not_break_selection():
+    options = details(['data1.local', 'data1.local', 'data2.local',
+                       'data2.local', 'data2.local'])
+    selector = MirrorSelector()
+    selector.record_transfer('http://data1.local/x', 0, 0.5)
+    #Counted as a failure, the host is penalized but still usable.
+    throughput = selector.stats('http://data1.local/x')[0]
+    assert 0 < throughput < selector.default_throughput
+    assert selector.select(options) is not None
+
+    for _ in range(100):
+        selector.record_failure('http://data1.local/x')
+    assert selector.stats('http://data1.local/x')[0] > 0
+    assert selector.select(options)[0] is Q.mp3_320kbps
@@ -0,0 +1,26 @@
+#Imports
+import pickle
+
+from musicutil.MusicSource import chiasenhac_vn
+from musicutil.parsing import ParsePool
+
+from conftest import search_page, song_page
+
+
+def test_pool_parses_realistic_pages():
+    #Real search pages have hundreds of items, each result string
+    #used to pickle the whole bs4 tree with it.
+    html = search_page('hello', 1, count=400)
+    expected = list(chiasenhac_vn._scrap_search(html, 10))
+
+    with ParsePool(2) as pool:
+        result = pool.parse(chiasenhac_vn._scrap_search, html, 10)
+        info = pool.parse(chiasenhac_vn._scrap_song_info, song_page('x'))
+        pages = pool.map(chiasenhac_vn._scrap_download_details,
+                         [song_page(n) for n in 'abc'], chunksize=2)
+
+    assert result == expected and len(result) == 10
+    assert all(type(value) is str for song in result for value in song)
+    assert len(pickle.dumps(result)) < 1024
+    assert info[0] == 'x' and info[4] == ('la', 'la')
+    assert [len(page) for page in pages] == [2, 2, 2]
@@ -0,0 +1,142 @@
+#Imports
+import threading
+
+import pytest
+
+from musicutil import playlist
+from musicutil.playlist import (Track, MatchCache, tracks_from_spotify,
+                                resolve_tracks)
+
+from conftest import hits_page, song_page
+
+#query => search hits served for it
+CATALOG = {
+    'Yellow Coldplay': [('Yellow (Live)', 'Coldplay', 'song/yellow.html'),
+                        ('Yellow Submarine', 'The Beatles',
+                         'song/submarine.html')],
+    'Ride Twenty One Pilots': [('Ride', 'Twenty One Pilots',
+                                'song/ride.html')],
+    'Nothing Nobody': [('Completely Different', 'Other Band', 'song/other.html')],
+}
+
+
+class FakeSpotify:
+    """Stand-in of spotipy.Spotify serving playlist pages."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def user_playlist_tracks(self, username, playlist_id):
+        self.calls.append((username, playlist_id))
+        return self.pages[0]
+
+    def next(self, page):
+        return self.pages[page['next']]
+
+
+def spotify_item(name, artists, album):
+    return {'track': {'name': name, 'album': {'name': album},
+                      'artists': [{'name': a} for a in artists]}}
+
+
+def catalog_routes():
+    def search(path, query):
+        hits = CATALOG.get(query['q'][0])
+        #Unknown queries stand for a source outage.
+        return hits_page(hits) if hits is not None else None
+
+    def song(path, query):
+        return song_page(path.rsplit('/', 1)[1][:-len('.html')])
+
+    return {'/tim-kiem': search, '/song/*': song}
+
+
+def test_tracks_from_spotify_follows_pages():
+    client = FakeSpotify([
+        {'items': [spotify_item('Yellow', ['Coldplay'], 'Parachutes'),
+                   {'track': None}],
+         'next': 1},
+        {'items': [spotify_item('Ride', ['Twenty One Pilots', 'X'],
+                                'Blurryface')],
+         'next': None},
+    ])
+
+    tracks = tracks_from_spotify(client, 'playlist', 'user')
+
+    assert client.calls == [('user', 'playlist')]
+    assert tracks == [
+        Track('Yellow', ('Coldplay', ), 'Parachutes'),
+        Track('Ride', ('Twenty One Pilots', 'X'), 'Blurryface'),
+    ]
+
+
+def test_resolve_tracks_matches_caches_and_reports_errors(
+        page_server, make_source, tmp_path):
+    server = page_server(catalog_routes())
+    source = make_source(server, thread_safe=True, requests_session=True)
+    tracks = [
+        Track('Yellow', ('Coldplay', ), None),
+        Track('Ride', ('Twenty One Pilots', ), None),
+        Track('Nothing', ('Nobody', ), None),
+        Track('Offline', ('Down', ), None),
+    ]
+    cache = MatchCache(str(tmp_path / 'matches.json'))
+
+    with pytest.warns(UserWarning, match='1 of 4 tracks failed'):
+        results = resolve_tracks(source, tracks, workers=4, cache=cache)
+
+    (yellow, ride, nothing, offline) = results
+    assert yellow[1]['url'].endswith('song/yellow.html')
+    assert [d['quality'] for d in yellow[1]['downloads']] == [
+        '320kbps', '128kbps'
+    ]
+    assert ride[1]['song'] == 'Ride' and ride[1]['score'] == 1.0
+    #No acceptable hit is not an error.
+    assert nothing[1:] == (None, None)
+    #A failed lookup is reported, not hidden as a miss.
+    assert offline[1] is None and offline[2] is not None
+
+    #Matches (and misses) are cached on disk, failures are retried.
+    searches = server.hits['/tim-kiem']
+    cache = MatchCache(str(tmp_path / 'matches.json'))
+    with pytest.warns(UserWarning, match='1 of 4 tracks failed'):
+        again = resolve_tracks(source, tracks, workers=4, cache=cache)
+    assert [r[1] for r in again] == [r[1] for r in results]
+    assert server.hits['/tim-kiem'] == searches + 1
+
+
+def test_token_prompt_does_not_block_other_users(monkeypatch):
+    prompting = threading.Event()
+    release = threading.Event()
+    prompts = []
+
+    def prompt(username, scope=None, **kwargs):
+        prompts.append(username)
+        if username == 'slow':
+            prompting.set()
+            release.wait(5)
+        return 'token-' + username
+
+    monkeypatch.setattr(playlist, 'prompt_for_spotify_token', prompt)
+    monkeypatch.setattr(playlist, '_TOKENS', {})
+
+    slow = threading.Thread(target=playlist.get_spotify_token,
+                            args=('slow', ))
+    slow.start()
+    try:
+        assert prompting.wait(5)
+        #Another user gets its token while 'slow' is still prompted.
+        result = []
+        other = threading.Thread(
+            target=lambda: result.append(playlist.get_spotify_token('fast')))
+        other.start()
+        other.join(2)
+        assert result == ['token-fast']
+    finally:
+        release.set()
+        slow.join()
+
+    #Cached tokens are not prompted again.
+    assert playlist.get_spotify_token('slow') == 'token-slow'
+    assert sorted(prompts) == ['fast', 'slow']
@@ -0,0 +1,113 @@
+#Imports
+import time
+
+from musicutil.prefetch import LRUCache, Prefetcher
+
+from conftest import source_routes
+
+
+def wait_idle(prefetcher, timeout=5):
+    end = time.monotonic() + timeout
+    while prefetcher._outstanding and time.monotonic() < end:
+        time.sleep(0.01)
+    assert not prefetcher._outstanding
+
+
+def song_hits(server):
+    return {path: n for path, n in server.hits.items()
+            if path.startswith('/song/')}
+
+
+def song_path(query, i):
+    return '/song/{0}-1-{1}.html'.format(query, i)
+
+
+def test_top_hits_are_prefetched_and_served(page_server, make_source):
+    server = page_server(source_routes())
+    prefetcher = Prefetcher(make_source(server, thread_safe=True), top_k=3)
+    try:
+        hits = prefetcher.search('q', 10)
+        assert len(hits) == 10
+        wait_idle(prefetcher)
+        assert song_hits(server) == {song_path('q', i): 1 for i in range(3)}
+
+        #Relative and absolute urls are the same page.
+        info = prefetcher.song_info(hits[0][2])
+        details = prefetcher.download_details(server.url + hits[0][2])
+        assert info[0] == 'q-1-0' and len(details) == 2
+        #Served from the prefetched page.
+        assert song_hits(server)[song_path('q', 0)] == 1
+
+        #Not prefetched, fetched on demand once.
+        url = server.url + hits[5][2]
+        prefetcher.song_info(url)
+        prefetcher.download_details(url)
+        assert song_hits(server)[song_path('q', 5)] == 1
+    finally:
+        prefetcher.close()
+
+
+def slow_song_routes(delay):
+    routes = source_routes()
+    song = routes['/song/*']
+
+    def slow_song(path, query):
+        time.sleep(delay)
+        return song(path, query)
+
+    routes['/song/*'] = slow_song
+    return routes
+
+
+def test_new_search_cancels_queued_prefetches(page_server, make_source):
+    server = page_server(slow_song_routes(0.3))
+    prefetcher = Prefetcher(make_source(server, thread_safe=True), top_k=3,
+                            workers=1)
+    try:
+        prefetcher.search('a', 10, session='user')
+        prefetcher.search('b', 10, session='user')
+        #Other sessions do not cancel the prefetches of 'user'.
+        prefetcher.search('c', 10, session='other')
+        wait_idle(prefetcher, timeout=10)
+
+        fetched = song_hits(server)
+        #Only the prefetch already running for 'a' went through.
+        assert sum(1 for i in range(3) if song_path('a', i) in fetched) <= 1
+        assert all(song_path('b', i) in fetched for i in range(3))
+        assert all(song_path('c', i) in fetched for i in range(3))
+    finally:
+        prefetcher.close()
+
+
+def test_budget_caps_outstanding_prefetches(page_server, make_source):
+    server = page_server(slow_song_routes(0.1))
+    prefetcher = Prefetcher(make_source(server, thread_safe=True), top_k=5,
+                            workers=1, budget=2)
+    try:
+        prefetcher.search('q', 10)
+        assert prefetcher._outstanding <= 2
+        wait_idle(prefetcher)
+        assert song_hits(server) == {song_path('q', i): 1 for i in range(2)}
+    finally:
+        prefetcher.close()
+
+
+def test_lru_bound(page_server, make_source):
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    #'b' was the least recently used.
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert len(cache) == 2
+
+    server = page_server(source_routes())
+    prefetcher = Prefetcher(make_source(server, thread_safe=True), top_k=3,
+                            cache_size=2)
+    try:
+        prefetcher.search('q', 10)
+        wait_idle(prefetcher)
+        assert len(prefetcher.cache) == 2
+    finally:
+        prefetcher.close()
@@ -0,0 +1,48 @@
+#Imports
+import types
+
+import pytest
+
+from conftest import hits_page, search_page
+
+
+def paged_routes(pages):
+    """Search with 'pages' full pages of results, then empty ones."""
+    def search(path, query):
+        page = int(query.get('page_music', ['1'])[0])
+        if page > pages:
+            return hits_page(())
+        return search_page(query['q'][0], page)
+    return {'/tim-kiem': search}
+
+
+@pytest.mark.parametrize('coalesce', [False, 'call'])
+def test_stream_search_stops_at_max(page_server, make_source, coalesce):
+    server = page_server(paged_routes(3))
+    source = make_source(server, coalesce=coalesce)
+
+    results = source.search('q', 3, stream=True)
+    #Nothing is fetched until results are asked for.
+    assert isinstance(results, types.GeneratorType)
+    assert '/tim-kiem' not in server.hits
+
+    assert next(results) == ('q 1-0', 'Artist q', 'song/q-1-0.html')
+    assert [r[0] for r in results] == ['q 1-1', 'q 1-2']
+    assert server.hits['/tim-kiem'] == 1
+
+    results = list(source.search('q', 12, stream=True))
+    assert [r[0] for r in results][-3:] == ['q 1-9', 'q 2-0', 'q 2-1']
+    assert server.hits['/tim-kiem'] == 3
+
+
+def test_stream_search_stops_on_empty_page(page_server, make_source):
+    server = page_server(paged_routes(1))
+    source = make_source(server)
+
+    assert len(list(source.search('q', 25, stream=True))) == 10
+    assert server.hits['/tim-kiem'] == 2
+
+    songs = list(source.search('q', 2, json_serializable=True, stream=True))
+    assert songs == [{'song': 'q 1-{0}'.format(i), 'artist': 'Artist q',
+                      'url': 'song/q-1-{0}.html'.format(i)}
+                     for i in range(2)]
@@ -0,0 +1,124 @@
+#Imports
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from musicutil.singleflight import SingleFlight, coalesced
+
+from conftest import source_routes
+
+
+class Source:
+    """Stand-in of a source with a slow coalesced method."""
+
+    def __init__(self, coalesce='call'):
+        self.coalesce = coalesce
+        self._flight = SingleFlight()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @coalesced
+    def search(self, query, max=10, options=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return iter([(query, i) for i in range(max)])
+
+
+def run_together(*funcs):
+    with ThreadPoolExecutor(len(funcs)) as pool:
+        return [f.result() for f in [pool.submit(func) for func in funcs]]
+
+
+def test_equivalent_calls_are_coalesced():
+    source = Source()
+    results = run_together(lambda: source.search('q'),
+                           lambda: source.search('q', 10),
+                           lambda: source.search(query='q', max=10))
+    assert source.calls == 1
+    assert all(r == [('q', i) for i in range(10)] for r in results)
+
+    #Different arguments are separate calls.
+    run_together(lambda: source.search('q', 5), lambda: source.search('p'))
+    assert source.calls == 3
+
+
+def test_callers_get_their_own_results():
+    source = Source()
+    first, second = run_together(lambda: source.search('q'),
+                                 lambda: source.search('q'))
+    assert source.calls == 1
+    first.clear()
+    assert len(second) == 10
+
+
+def test_unhashable_arguments_are_not_coalesced():
+    source = Source()
+    results = run_together(lambda: source.search('q', options=['a']),
+                           lambda: source.search('q', options=['a']))
+    assert source.calls == 2
+    assert list(results[0]) == list(results[1])
+
+
+def test_errors_are_shared():
+    flight = SingleFlight()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError('down')
+
+    def call():
+        with pytest.raises(ValueError):
+            flight.do('key', fail)
+
+    run_together(call, call, call)
+    assert len(calls) == 1
+
+
+def test_async_calls_are_coalesced():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'page'
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do_async('key', fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == ['page'] * 5
+    assert len(calls) == 1
+
+
+def test_source_request_coalescing(page_server, make_source):
+    routes = source_routes()
+    routes['/echo'] = lambda path, query: repr(sorted(query.items()))
+    server = page_server(routes, delay=0.2)
+    source = make_source(server, coalesce='request', thread_safe=True,
+                         requests_session=True)
+
+    #Relative and absolute urls of a page are the same request.
+    pages = run_together(lambda: source._get('song/x.html'),
+                         lambda: source._get(server.url + 'song/x.html'),
+                         lambda: source._get('song/x.html'))
+    assert server.hits['/song/x.html'] == 1
+    assert pages[0] == pages[1] == pages[2]
+
+    #Different params are different requests.
+    run_together(lambda: source._get('echo', page_music='1'),
+                 lambda: source._get('echo', page_music='1'),
+                 lambda: source._get('echo', page_music='2'))
+    assert server.hits['/echo'] == 2
+
+    #Unhashable (list) params are sent without coalescing.
+    pages = run_together(lambda: source._get('echo', page_music=['1', '2']),
+                         lambda: source._get('echo', page_music=['1', '2']))
+    assert server.hits['/echo'] == 4
+    assert pages[0] == pages[1] and "['1', '2']" in pages[0]
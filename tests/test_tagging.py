@@ -0,0 +1,97 @@
+#Imports
+import io
+import struct
+
+from musicutil.tagging import (TaggingWriter, build_id3, build_vorbis_comment,
+                               _id3_frame, _syncsafe, _unsyncsafe)
+
+INFO = ('Ride', 'Twenty One Pilots', 'Blurryface', '2015', ['la', 'la'])
+AUDIO = b'\xff\xfb' + bytes(range(256)) * 8
+
+
+def write(data, info, fmt, step=7):
+    out = io.BytesIO()
+    writer = TaggingWriter(out, info, fmt)
+    for i in range(0, len(data), step):
+        writer.write(data[i:i + step])
+    writer.close()
+    return out.getvalue()
+
+
+def id3_frames(data):
+    """Returns (version, {frame id: [frame data]}, rest of data)."""
+    version = data[3]
+    end = 10 + _unsyncsafe(data[6:10])
+    frames = {}
+    pos = 10
+    while pos + 10 <= end and data[pos] != 0:
+        raw = data[pos + 4:pos + 8]
+        size = _unsyncsafe(raw) if version == 4 else \
+            struct.unpack('>I', raw)[0]
+        frames.setdefault(data[pos:pos + 4].decode(), []).append(
+            data[pos + 10:pos + 10 + size])
+        pos += 10 + size
+    return version, frames, data[end:]
+
+
+def text(frame):
+    assert frame[0] == 1
+    return frame[1:].decode('utf-16')
+
+
+def old_tag(version, frames, padding=16):
+    data = b''.join(_id3_frame(fid, body, version) for fid, body in frames)
+    data += b'\x00' * padding
+    return b'ID3' + bytes((version, )) + b'\x00\x00' + \
+        _syncsafe(len(data)) + data
+
+
+def test_mp3_without_tag():
+    version, frames, rest = id3_frames(write(AUDIO, INFO, 'mp3'))
+    assert version == 3 and rest == AUDIO
+    assert text(frames['TIT2'][0]) == 'Ride'
+    assert text(frames['TYER'][0]) == '2015'
+    assert frames['USLT'][0][1:4] == b'xxx'
+
+
+def test_mp3_existing_tag_is_merged():
+    picture = b'\x00image/jpeg\x00\x03\x00' + bytes(range(256)) * 40
+    for version, year in ((3, 'TYER'), (4, 'TDRC')):
+        tag = old_tag(version, [('TIT2', b'\x00Old title'),
+                                ('APIC', picture),
+                                ('TCON', b'\x00Pop')])
+        out = write(tag + AUDIO, {'name': 'Ride', 'year': '2015'}, 'mp3')
+
+        got, frames, rest = id3_frames(out)
+        assert got == version and rest == AUDIO
+        assert [text(f) for f in frames['TIT2']] == ['Ride']
+        assert text(frames[year][0]) == '2015'
+        #Frames not in song info are kept as they were.
+        assert frames['APIC'] == [picture]
+        assert frames['TCON'] == [b'\x00Pop']
+
+
+def test_unsupported_tag_is_replaced():
+    #ID3v2.2 (3 character frame ids) can not be merged.
+    tag = b'ID3\x02\x00\x00' + _syncsafe(20) + b'TT2\x00\x00\x05\x00Old' + \
+        b'\x00' * 10
+    version, frames, rest = id3_frames(write(tag + AUDIO, INFO, 'mp3'))
+    assert version == 3 and rest == AUDIO
+    assert text(frames['TIT2'][0]) == 'Ride'
+
+
+def test_flac_comment_is_replaced():
+    streaminfo = b'\x00' + struct.pack('>I', 34)[1:] + b'\x11' * 34
+    comment = build_vorbis_comment({'name': 'Old'}, last=False)
+    picture = b'\x86' + struct.pack('>I', 8)[1:] + b'P' * 8
+    flac = b'fLaC' + streaminfo + comment + picture + AUDIO
+
+    out = write(flac, INFO, 'flac')
+    assert out == b'fLaC' + streaminfo + b'\x06' + picture[1:] + \
+        build_vorbis_comment(INFO) + AUDIO
+
+
+def test_short_stream_is_kept():
+    assert write(b'ab', INFO, 'mp3') == build_id3(INFO) + b'ab'
+    tag = old_tag(3, [('TIT2', b'\x00Old')])
+    assert write(tag[:12], INFO, 'mp3') == tag[:12]
@@ -0,0 +1,109 @@
+#Imports
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from musicutil.MusicSource import chiasenhac_vn
+from musicutil.util import Cache
+
+from conftest import source_routes, homepage_route
+
+THREADS = 16
+CALLS = 8
+
+
+def test_shared_source_under_many_threads(page_server, make_source):
+    server = page_server(source_routes(), delay=0.01)
+    source = make_source(server, thread_safe=True, requests_session=True)
+
+    def work(n):
+        query = 'q{0}'.format(n)
+        results = list(source.search(query, 10))
+        assert [r[0] for r in results] == [
+            '{0} 1-{1}'.format(query, i) for i in range(10)
+        ]
+        assert all(r[1] == 'Artist ' + query for r in results)
+
+        song = '{0}-1-0'.format(query)
+        url = '{0}song/{1}.html'.format(server.url, song)
+        details = source.download_details(url)
+        assert [d[0] for d in details] == [
+            chiasenhac_vn.Quality.mp3_320kbps,
+            chiasenhac_vn.Quality.mp3_128kbps
+        ]
+        assert all(song in d[1] for d in details)
+
+        info = source.song_info(url)
+        assert info[0] == song
+        assert info[1] == 'Artist ' + song
+        return n
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        done = list(executor.map(work, range(THREADS * CALLS)))
+
+    assert done == list(range(THREADS * CALLS))
+    assert server.hits['/tim-kiem'] == THREADS * CALLS
+    #Per request headers never leak into the shared ones.
+    assert source.header == chiasenhac_vn._HEADERS
+
+
+def test_search_url_update_under_many_threads(page_server, make_source,
+                                              tmp_path, monkeypatch):
+    monkeypatch.setattr(Cache, 'CACHE_DIR', str(tmp_path))
+    server = page_server(source_routes(), delay=0.01)
+    server.routes['/'] = homepage_route(server)
+    source = make_source(server, search_url=False, thread_safe=True,
+                         requests_session=True)
+    start = threading.Barrier(THREADS)
+
+    def work(n):
+        start.wait()
+        query = 'q{0}'.format(n)
+        #Goes through _update_search_url and the cached get_search_url.
+        results = list(source.search(query, 10))
+        assert [r[0] for r in results] == [
+            '{0} 1-{1}'.format(query, i) for i in range(10)
+        ]
+        return source._S_URL
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        urls = list(executor.map(work, range(THREADS)))
+
+    assert set(urls) == {server.url + 'tim-kiem'}
+    assert server.hits['/tim-kiem'] == THREADS
+    assert (tmp_path / 'get_search_url.cache').exists()
+
+    #Later searches use the cached url, without a homepage fetch.
+    homepage_hits = server.hits['/']
+    assert 1 <= homepage_hits <= THREADS
+    list(source.search('again', 10))
+    assert server.hits['/'] == homepage_hits
+
+
+def test_cache_miss_does_not_block_other_calls(tmp_path):
+    started = threading.Event()
+    release = threading.Event()
+
+    @Cache.cache_constant(str(tmp_path / 'slow.cache'))
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'slow'
+
+    @Cache.cache_constant(str(tmp_path / 'fast.cache'))
+    def fast():
+        return 'fast'
+
+    thread = threading.Thread(target=slow)
+    thread.start()
+    try:
+        assert started.wait(5)
+        #Runs while slow() is still fetching.
+        result = []
+        other = threading.Thread(target=lambda: result.append(fast()))
+        other.start()
+        other.join(2)
+        assert result == ['fast']
+    finally:
+        release.set()
+        thread.join()
+    assert slow() == 'slow'
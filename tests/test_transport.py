@@ -0,0 +1,100 @@
+#Imports
+import json
+from urllib.parse import parse_qs
+
+import pytest
+
+from musicutil.MusicSource import chiasenhac_vn
+from musicutil.transport import TRANSPORTS, get_transport, benchmark
+
+from conftest import source_routes, Redirect
+
+
+@pytest.fixture(params=sorted(TRANSPORTS))
+def transport_name(request):
+    if request.param == 'http2':
+        pytest.importorskip('httpx')
+        pytest.importorskip('h2')
+    return request.param
+
+
+def make_transport(name):
+    transport_class = get_transport(name)
+    if transport_class is get_transport('requests'):
+        return transport_class(True)
+    return transport_class()
+
+
+def routes():
+    routes = source_routes()
+    routes.update({
+        '/echo': lambda path, query: (json.dumps(query), 'application/json'),
+        '/old': lambda path, query: Redirect('/echo?moved=1'),
+        '/latin': lambda path, query: ('caf\xe9'.encode('latin-1'),
+                                       'text/plain; charset=iso-8859-1'),
+        '/plain': lambda path, query: ('caf\xe9'.encode('utf-8'),
+                                       'text/plain'),
+    })
+    return routes
+
+
+def test_request_basics(page_server, transport_name):
+    server = page_server(routes())
+    transport = make_transport(transport_name)
+    try:
+        r = transport.request('GET', server.url + 'echo', params={
+            'q': 'a b&c', 'page': ['1', '2'], 'skip': None})
+        assert r.ok and r.status_code == 200
+        assert parse_qs(r.url.split('?', 1)[1]) == {'q': ['a b&c'],
+                                                    'page': ['1', '2']}
+        assert r.json() == {'q': ['a b&c'], 'page': ['1', '2']}
+
+        r = transport.request('GET', server.url + 'old')
+        assert r.json() == {'moved': ['1']}
+        assert r.url.endswith('/echo?moved=1')
+
+        assert transport.request('GET', server.url + 'latin').text == \
+            'caf\xe9'
+        #No charset, utf-8 is assumed.
+        assert transport.request('GET', server.url + 'plain').text == \
+            'caf\xe9'
+
+        r = transport.request('GET', server.url + 'missing')
+        assert not r.ok and r.status_code == 404
+
+        with transport.stream('GET', server.url + 'latin') as r:
+            assert r.ok and r.encoding.lower() in ('iso-8859-1', 'latin-1')
+            assert b''.join(r.iter_bytes()) == 'caf\xe9'.encode('latin-1')
+    finally:
+        transport.close()
+
+
+def test_source_over_transport(page_server, make_source, transport_name):
+    server = page_server(routes())
+    source = make_source(server, thread_safe=True, requests_session=True,
+                         transport=transport_name)
+
+    results = list(source.search('hello', 3))
+    assert [r[0] for r in results] == ['hello 1-0', 'hello 1-1', 'hello 1-2']
+    #Source headers include hop-by-hop ones (Connection, Host).
+    assert server.headers['/tim-kiem']['Host'] == \
+        '127.0.0.1:{0}'.format(server.port)
+
+    streamed = list(source.search('hello', 12, stream=True))
+    assert [r[0] for r in streamed][10:] == ['hello 2-0', 'hello 2-1']
+
+    url = server.url + 'song/' + 'hello-1-0.html'
+    info = source.song_info(url)
+    assert info[:4] == ('hello-1-0', 'Artist hello-1-0', 'Album hello-1-0',
+                        '2019')
+    assert [d[0] for d in source.download_details(url)] == [
+        chiasenhac_vn.Quality.mp3_320kbps, chiasenhac_vn.Quality.mp3_128kbps
+    ]
+
+
+def test_benchmark(page_server):
+    server = page_server(routes())
+    results = benchmark(server.url + 'echo', total=20, workers=4)
+    assert {'requests', 'urllib3'} <= set(results)
+    for rps, latency in results.values():
+        assert rps > 0 and latency > 0
@@ -0,0 +1,156 @@
+#Imports
+import socket
+import threading
+import time
+from concurrent.futures import wait
+
+import pytest
+
+from musicutil import warmup
+from musicutil.warmup import DNSCache, Warmer
+
+from conftest import song_page
+
+
+class FakeResolver:
+    """Stand-in of socket.getaddrinfo counting lookups."""
+
+    def __init__(self, fail=0):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, host, port, *args):
+        self.calls.append(host)
+        if self.fail:
+            self.fail -= 1
+            raise socket.gaierror('lookup failed')
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+                 ('127.0.0.1', port))]
+
+
+@pytest.fixture
+def resolver(monkeypatch):
+    fake = FakeResolver()
+    monkeypatch.setattr(warmup, '_getaddrinfo', fake)
+    return fake
+
+
+def test_dns_cache_ttl(resolver):
+    dns = DNSCache(ttl=0.2)
+    first = dns.resolve('example.test', 80)
+    assert dns.resolve('example.test', 80) == first
+    assert resolver.calls == ['example.test']
+
+    time.sleep(0.25)
+    dns.resolve('example.test', 80)
+    assert resolver.calls == ['example.test'] * 2
+
+
+def test_dns_cache_failures_are_not_cached(resolver):
+    resolver.fail = 1
+    dns = DNSCache()
+    with pytest.raises(socket.gaierror):
+        dns.resolve('example.test')
+    assert dns.resolve('example.test')
+    assert len(resolver.calls) == 2
+
+
+def test_dns_cache_install():
+    original = socket.getaddrinfo
+    dns = DNSCache().install()
+    try:
+        assert socket.getaddrinfo == dns.getaddrinfo
+        assert socket.getaddrinfo('127.0.0.1', 80)
+    finally:
+        DNSCache.uninstall()
+    assert socket.getaddrinfo is original
+
+
+class FakeTransport:
+    keeps_connections = True
+
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.urls = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, timeout=None):
+        with self._lock:
+            self.urls.append((method, url))
+            fail = self.fail
+            self.fail = max(0, fail - 1)
+        if fail:
+            raise OSError('connection refused')
+
+
+def test_warm_deduplicates_and_retries(resolver):
+    warmer = Warmer(dns=DNSCache(), ttl=60)
+    transport = FakeTransport(fail=1)
+    try:
+        futures = warmer.warm(['http://a.test/x', 'http://a.test/y', None,
+                               'http://b.test:8080/z'], transport)
+        wait(futures)
+        assert len(futures) == 2
+        #Warmed recently, unless the warm up failed.
+        futures = warmer.warm(['http://a.test/1', 'http://b.test:8080/2'],
+                              transport)
+        wait(futures)
+        assert len(futures) == 1
+        #The failed host (the first one warmed) is warmed again.
+        assert len(transport.urls) == 3
+        assert transport.urls[2] == transport.urls[0]
+
+        transport.keeps_connections = False
+        wait(warmer.warm(['http://c.test/'], transport))
+        assert 'c.test' in resolver.calls
+        assert ('HEAD', 'http://c.test/') not in transport.urls
+    finally:
+        warmer.close()
+
+
+def wait_for_hit(server, path, timeout=5):
+    end = time.monotonic() + timeout
+    while path not in server.hits and time.monotonic() < end:
+        time.sleep(0.01)
+    return server.hits.get(path, 0)
+
+
+def test_source_warms_its_hosts(page_server):
+    from musicutil.MusicSource import chiasenhac_vn
+
+    data = page_server()
+    site = page_server()
+    site.routes['/song/*'] = lambda path, query: song_page('s').replace(
+        'http://data0.local/', data.url)
+
+    class LocalSource(chiasenhac_vn):
+        _PREFIX = site.url
+
+    warmer = Warmer()
+    try:
+        source = LocalSource(thread_safe=True, requests_session=True,
+                             warmer=warmer)
+        assert wait_for_hit(site, '/') == 1
+
+        source.download_details(site.url + 'song/s.html')
+        assert wait_for_hit(data, '/') == 1
+    finally:
+        warmer.close()
+
+
+def test_non_pooling_source_only_resolves(page_server):
+    from musicutil.MusicSource import chiasenhac_vn
+
+    site = page_server()
+
+    class LocalSource(chiasenhac_vn):
+        _PREFIX = site.url
+
+    warmer = Warmer()
+    try:
+        LocalSource(warmer=warmer)
+        #Wait for the warm up to finish.
+        warmer._executor.shutdown(wait=True)
+        assert '/' not in site.hits
+    finally:
+        warmer.close()